@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""把一组不带 para_id 的标准修订编译一次，批量套用到一个目录的 docx。
+
+同一份模板生成的合同，标准条款的修订（"根据本合同" → "依据本合同" 等）每次都一样。
+这里把这组 decision 编译成可复用的匹配器：
+  1. validate() 只跑一次，para_id 一律忽略
+  2. 所有 match_text 编译成一个 Aho-Corasick 自动机，只建一次
+  3. 每份文档：各部件的段落原文扫一遍，每条 decision 套用到所有包含 match_text 的段落
+     （每个段落一份副本；段内仍只改第一处，与 inject 一致），然后走 inject 的分组注入
+
+每份文档返回与 inject() 相同结构的摘要字典，total 为展开后的条数，另附 occurrences：
+每条模板 decision 套用到的段落数；文档里找不到的条目计入 skipped。
+
+用法：
+    python3 apply_template.py template.json contracts/ --output-dir reviewed/
+    python3 apply_template.py template.json contracts/ --output-dir reviewed/ --author 法务部 --initials 法
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# 保证同目录 import 可用
+sys.path.insert(0, str(Path(__file__).parent))
+
+from validate_decisions import load_document, validate  # noqa: E402
+from inject_comments import compile_patterns, decision_part, inject_decisions, scan_hits  # noqa: E402
+
+
+class CompiledTemplate:
+    """编译好的 decision 模板：校验结果 + 自动机，可反复套用到多份文档。"""
+
+    def __init__(self, raw):
+        cleaned, self.errors = validate(raw, locate=True)
+        self.mode = cleaned["mode"]
+        self.decisions = []
+        for d in cleaned["decisions"]:
+            d = dict(d)
+            d.pop("para_id", None)
+            self.decisions.append(d)
+        self.automaton, self.pattern_ids = compile_patterns(self.decisions)
+
+    def expand(self, document: dict[str, dict[int, str]]) -> tuple[list, dict[int, int], list[int]]:
+        """把模板 decision 展开到文档里每个包含 match_text 的段落。
+
+        document 为 {部件: {para_id: 原文}}（validate_decisions.load_document）。
+        返回 (展开后的 decision 列表, {展开下标: 目标段落}, 每条模板 decision 命中的段落数)；
+        找不到的 decision 保留一份、不进 targets，由 locate 报出。
+        """
+        hits = {part: scan_hits(self.automaton, list(texts.values())) for part, texts in document.items()}
+        expanded: list = []
+        targets: dict[int, int] = {}
+        occurrences: list[int] = []
+        for dec in self.decisions:
+            part_hits = hits.get(decision_part(dec))
+            found = part_hits[self.pattern_ids[dec["match_text"]]] if part_hits else []
+            occurrences.append(len(found))
+            for pid in found:
+                targets[len(expanded)] = pid
+                expanded.append(dec)
+            if not found:
+                expanded.append(dec)
+        return expanded, targets, occurrences
+
+    def apply(self, input_docx: str, output_docx: str,
+              author: str = "Claude", initials: str = "C") -> dict:
+        """套用到一份文档，返回与 inject() 相同结构的摘要字典。"""
+        input_path = Path(input_docx)
+        if not input_path.exists():
+            raise FileNotFoundError(f"Input not found: {input_docx}")
+        expanded, targets, occurrences = self.expand(load_document(input_path))
+
+        def locate(texts: list[str], dec_list: list) -> tuple[dict[int, int], list[tuple[int, str]]]:
+            """inject_decisions 的 locator：按展开时算好的目标段落分派。
+
+            dec_list 按部件逐个传入，其他部件的 decision 位置为 None。
+            """
+            found: dict[int, int] = {}
+            notes: list[tuple[int, str]] = []
+            for i, dec in enumerate(dec_list):
+                if dec is None:
+                    continue  # 属于其他部件
+                if i in targets:
+                    found[i] = targets[i]
+                else:
+                    notes.append((i, f"decision[{i}]: match_text {dec['match_text']!r} not found in document"))
+            return found, notes
+
+        result = inject_decisions(input_path, expanded, Path(output_docx),
+                                  author, initials, locator=locate)
+        result["occurrences"] = occurrences
+        return result
+
+
+def compile_template(path: str) -> CompiledTemplate:
+    """从 decisions JSON 文件编译模板。"""
+    return CompiledTemplate(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def apply_template_dir(template: CompiledTemplate, input_dir: str, output_dir: str,
+                       author: str = "Claude", initials: str = "C",
+                       suffix: str = ".reviewed.docx") -> dict[str, dict]:
+    """把模板套用到 input_dir 下所有 .docx，结果写到 output_dir。
+
+    返回 {输入文件名: 摘要字典}；单份文档出错时摘要为 {"error": ...}，不影响其他文档。
+    """
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results: dict[str, dict] = {}
+    for src in sorted(Path(input_dir).glob("*.docx")):
+        # 跳过 Word 锁文件和上一轮的产出
+        if src.name.startswith("~$") or src.name.endswith(suffix):
+            continue
+        dst = out_dir / (src.stem + suffix)
+        try:
+            results[src.name] = template.apply(str(src), str(dst), author=author, initials=initials)
+        except Exception as e:
+            results[src.name] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Apply a compiled para_id-free decision set to a directory of .docx")
+    parser.add_argument("template", help="Decisions JSON (para_id is ignored)")
+    parser.add_argument("input_dir", help="Directory containing .docx files")
+    parser.add_argument("--output-dir", "-o", required=True, help="Directory for reviewed .docx files")
+    parser.add_argument("--author", default="Claude AI Reviewer", help="Author name")
+    parser.add_argument("--initials", default="AI", help="Author initials")
+    args = parser.parse_args()
+
+    try:
+        template = compile_template(args.template)
+    except Exception as e:
+        print(f"ERROR: cannot compile {args.template}: {e}", file=sys.stderr)
+        return 2
+    for err in template.errors:
+        print(f"WARN: {err}", file=sys.stderr)
+    if not template.decisions:
+        print("ERROR: no valid decisions in template", file=sys.stderr)
+        return 1
+
+    results = apply_template_dir(template, args.input_dir, args.output_dir,
+                                 author=args.author, initials=args.initials)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    failed = [name for name, r in results.items() if "error" in r]
+    hits = sum(r.get("success", 0) for r in results.values())
+    misses = sum(r.get("skipped", 0) for r in results.values())
+    print(f"\n{len(results)} documents: {hits} hits, {misses} misses, {len(failed)} failed",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""inject() 性能基准。
+
+场景：
+  - scaling（默认）：合成合同每段一条 decision，对不同规模跑 inject()，
+    输出总耗时和每条 decision 的平均耗时。线性时"每条耗时"应基本持平。
+  - dense：单个高度碎片化的段落上挂 K 条 decision，对比逐条路径
+    （_apply_decision，每条都重新拼文本 + 整段重建子元素）与分组路径
+    （RunIndex + _apply_paragraph，一次建索引、一次切分）。
+  - fragmented：scaling 的合成合同，但每段被切成 2 字一个 run（带不同 rsid + proofErr），
+    对比 inject() 开 / 不开 coalesce（run 合并预处理）的耗时和输出 document.xml 大小。
+  - parallel：scaling 的合成合同，对比单进程与 parallel=N（分片进程池）的耗时。
+    加速比受 CPU 核数限制；workers 列是实际进程数，核数不足 2 或 decision 少于
+    PARALLEL_MIN_DECISIONS 时为 0（inject() 回退单进程，两列耗时应当持平）。
+
+用法：
+    python3 bench_inject.py
+    python3 bench_inject.py --sizes 10,100,1000,5000 --repeat 3
+    python3 bench_inject.py --scenario dense --sizes 10,20,50,100
+    python3 bench_inject.py --scenario fragmented --sizes 100,1000
+    python3 bench_inject.py --scenario parallel --sizes 5000,20000 --workers 8
+
+依赖：python-docx、lxml
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from docx import Document
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from lxml import etree
+except ImportError as e:
+    print(f"ERROR: missing dependency ({e}). Run: pip install python-docx lxml", file=sys.stderr)
+    sys.exit(1)
+
+from inject_comments import (  # noqa: E402
+    RunIndex, _apply_decision, _apply_paragraph, _resolve_paragraph, inject,
+)
+
+ACTIONS = ["replace", "comment_only", "insert_after", "delete"]
+
+
+def make_fixture(workdir: Path, n: int) -> tuple[Path, Path]:
+    """生成 n 段的合成 docx 和对应的 n 条 decisions。"""
+    doc = Document()
+    decisions = []
+    for i in range(n):
+        doc.add_paragraph(f"第{i}条 根据本合同，甲方应于内容发布后30日内向乙方支付费用。")
+        action = ACTIONS[i % len(ACTIONS)]
+        decisions.append({
+            "para_id": i,
+            "match_text": "根据本合同" if action != "insert_after" else "30日内",
+            "action": action,
+            "new_text": "依据本合同" if action == "replace"
+                        else "（以银行到账为准）" if action == "insert_after" else None,
+            "comment": f"基准批注 {i}",
+            "severity": "minor",
+        })
+    docx_path = workdir / f"bench_{n}.docx"
+    dec_path = workdir / f"bench_{n}.json"
+    doc.save(str(docx_path))
+    dec_path.write_text(json.dumps({"mode": "contract", "decisions": decisions},
+                                   ensure_ascii=False), encoding="utf-8")
+    return docx_path, dec_path
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_inject_") as tmp:
+        workdir = Path(tmp)
+        for n in sizes:
+            docx_path, dec_path = make_fixture(workdir, n)
+            out_path = workdir / f"bench_{n}.reviewed.docx"
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                result = inject(str(docx_path), str(dec_path), str(out_path))
+                best = min(best, time.perf_counter() - t0)
+            rows.append({
+                "decisions": n,
+                "success": result["success"],
+                "seconds": round(best, 4),
+                "us_per_decision": round(best / n * 1e6, 1),
+            })
+    return rows
+
+
+def make_fragmented_fixture(workdir: Path, n: int, run_chars: int = 2) -> tuple[Path, Path]:
+    """与 make_fixture 相同的文本和 decisions，但每段每 run_chars 个字一个 run，
+    每个 run 带不同的 rsid，每隔几个 run 夹一个 <w:proofErr>（模拟 Word 编辑过的合同）。"""
+    docx_path, dec_path = make_fixture(workdir, n)
+    doc = Document(str(docx_path))
+    for i, para in enumerate(doc.paragraphs):
+        text = para.text
+        for r in list(para.runs):
+            r._r.getparent().remove(r._r)
+        for k, pos in enumerate(range(0, len(text), run_chars)):
+            if k % 4 == 3:
+                err = OxmlElement("w:proofErr")
+                err.set(qn("w:type"), "spellStart" if k % 8 == 3 else "spellEnd")
+                para._p.append(err)
+            run = para.add_run(text[pos:pos + run_chars])
+            run._r.set(qn("w:rsidR"), f"{(i * 131 + k) & 0xFFFFFF:06X}00")
+            run._r.set(qn("w:rsidRPr"), f"{(i * 17 + k) & 0xFFFFFF:06X}00")
+    frag_path = workdir / f"bench_{n}.fragmented.docx"
+    doc.save(str(frag_path))
+    return frag_path, dec_path
+
+
+def run_fragmented(sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_inject_") as tmp:
+        workdir = Path(tmp)
+        for n in sizes:
+            docx_path, dec_path = make_fragmented_fixture(workdir, n)
+            row = {"decisions": n}
+            for label, coalesce in (("plain", False), ("coalesced", True)):
+                out_path = workdir / f"bench_{n}.{label}.docx"
+                best = float("inf")
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    result = inject(str(docx_path), str(dec_path), str(out_path), coalesce=coalesce)
+                    best = min(best, time.perf_counter() - t0)
+                with zipfile.ZipFile(out_path) as z:
+                    size = z.getinfo("word/document.xml").file_size
+                row[f"{label}_s"] = round(best, 4)
+                row[f"{label}_kb"] = round(size / 1024, 1)
+                if coalesce:
+                    row["runs_before"] = result["runs"]["before"]
+                    row["runs_after"] = result["runs"]["after"]
+            rows.append(row)
+    return rows
+
+
+def run_parallel(sizes: list[int], repeat: int, workers: int) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_inject_") as tmp:
+        workdir = Path(tmp)
+        for n in sizes:
+            docx_path, dec_path = make_fixture(workdir, n)
+            row = {"decisions": n}
+            for label, parallel in (("serial", 0), ("parallel", workers)):
+                out_path = workdir / f"bench_{n}.{label}.docx"
+                best = float("inf")
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    result = inject(str(docx_path), str(dec_path), str(out_path), parallel=parallel)
+                    best = min(best, time.perf_counter() - t0)
+                row[f"{label}_s"] = round(best, 4)
+                row[f"{label}_success"] = result["success"]
+            row["workers"] = result["parallel"]
+            row["speedup"] = round(row["serial_s"] / row["parallel_s"], 2)
+            rows.append(row)
+    return rows
+
+
+def make_dense_paragraph(k: int, run_chars: int = 3) -> tuple[etree._Element, list[dict]]:
+    """生成一个含 k 个条款片段的段落（每 run_chars 个字符一个 run），以及 k 条 decision。"""
+    clauses = [f"第{i:03d}项责任由乙方承担；" for i in range(k)]
+    text = "".join(clauses)
+    para = OxmlElement("w:p")
+    for pos in range(0, len(text), run_chars):
+        r = OxmlElement("w:r")
+        t = OxmlElement("w:t")
+        t.set(qn("xml:space"), "preserve")
+        t.text = text[pos:pos + run_chars]
+        r.append(t)
+        para.append(r)
+    decisions = [{"para_id": 0, "match_text": f"第{i:03d}项责任", "action": "comment_only",
+                  "new_text": None, "comment": "c", "severity": "minor"} for i in range(k)]
+    return para, decisions
+
+
+def run_dense(sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    for k in sizes:
+        legacy = grouped = float("inf")
+        for _ in range(repeat):
+            para, decisions = make_dense_paragraph(k)
+            t0 = time.perf_counter()
+            for n, dec in enumerate(decisions):
+                _apply_decision(para, dec, n, 1000 + n * 10, "bench", "2026-01-01T00:00:00Z")
+            legacy = min(legacy, time.perf_counter() - t0)
+
+            para, decisions = make_dense_paragraph(k)
+            t0 = time.perf_counter()
+            index = RunIndex(para)
+            accepted, _ = _resolve_paragraph(index, list(enumerate(decisions)))
+            _apply_paragraph(index, [(i, d, i, s, e) for i, d, s, e in accepted],
+                             1000, "bench", "2026-01-01T00:00:00Z")
+            grouped = min(grouped, time.perf_counter() - t0)
+        rows.append({
+            "decisions": k,
+            "runs": len(para),
+            "legacy_ms": round(legacy * 1e3, 2),
+            "grouped_ms": round(grouped * 1e3, 2),
+            "speedup": round(legacy / grouped, 1),
+        })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark inject() scaling")
+    parser.add_argument("--scenario", choices=["scaling", "dense", "fragmented", "parallel"], default="scaling",
+                        help="scaling: whole-document inject(); dense: many decisions in one paragraph; "
+                             "fragmented: inject() with and without run coalescing; "
+                             "parallel: single process vs sharded process pool")
+    parser.add_argument("--sizes", help="Comma-separated decision counts "
+                        "(default: 10,100,500,1000,2000,5000 for scaling/fragmented; 10,20,50,100,200 for dense)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size (best is kept)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the parallel scenario (default: CPU count)")
+    args = parser.parse_args()
+
+    default_sizes = "10,20,50,100,200" if args.scenario == "dense" else "10,100,500,1000,2000,5000"
+    sizes = [int(x) for x in (args.sizes or default_sizes).split(",") if x.strip()]
+
+    if args.scenario == "dense":
+        rows = run_dense(sizes, args.repeat)
+        print(f"{'decisions':>10} {'runs':>8} {'legacy ms':>10} {'grouped ms':>11} {'speedup':>8}")
+        for r in rows:
+            print(f"{r['decisions']:>10} {r['runs']:>8} {r['legacy_ms']:>10.2f} "
+                  f"{r['grouped_ms']:>11.2f} {r['speedup']:>7.1f}x")
+        return 0
+
+    if args.scenario == "fragmented":
+        rows = run_fragmented(sizes, args.repeat)
+        print(f"{'decisions':>10} {'runs':>16} {'plain s':>9} {'merged s':>9} {'plain KB':>9} {'merged KB':>10}")
+        for r in rows:
+            runs = f"{r['runs_before']}->{r['runs_after']}"
+            print(f"{r['decisions']:>10} {runs:>16} {r['plain_s']:>9.3f} {r['coalesced_s']:>9.3f} "
+                  f"{r['plain_kb']:>9.1f} {r['coalesced_kb']:>10.1f}")
+        return 0
+
+    if args.scenario == "parallel":
+        rows = run_parallel(sizes, args.repeat, args.workers)
+        print(f"{'decisions':>10} {'workers':>8} {'serial s':>9} {'parallel s':>11} {'speedup':>8}")
+        for r in rows:
+            print(f"{r['decisions']:>10} {r['workers']:>8} {r['serial_s']:>9.3f} {r['parallel_s']:>11.3f} "
+                  f"{r['speedup']:>7.2f}x")
+        return 0
+
+    rows = run(sizes, args.repeat)
+
+    print(f"{'decisions':>10} {'success':>8} {'seconds':>9} {'us/decision':>12}")
+    for r in rows:
+        print(f"{r['decisions']:>10} {r['success']:>8} {r['seconds']:>9.3f} {r['us_per_decision']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""read_docx() 提取引擎基准：lxml 流式 vs python-docx。
+
+合成 N 段的合同（每 50 段插一张带横向 / 纵向合并的 4×4 表格），
+每个引擎在独立子进程里跑一次，报告耗时和峰值 RSS，并校验两者输出 JSON 完全相同。
+
+用法：
+    python3 bench_read.py
+    python3 bench_read.py --sizes 1000,10000,100000
+
+依赖：python-docx、lxml；峰值内存用 resource 模块（Linux / macOS）
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    from docx import Document
+except ImportError as e:
+    print(f"ERROR: missing dependency ({e}). Run: pip install python-docx lxml", file=sys.stderr)
+    sys.exit(1)
+
+from read_docx import ENGINES, read_docx  # noqa: E402
+
+
+def make_fixture(path: Path, n: int) -> None:
+    """生成 n 段的合成 docx：标题 / 正文交替，每 50 段一张有合并单元格的表格。"""
+    doc = Document()
+    for i in range(n):
+        if i % 20 == 0:
+            doc.add_heading(f"第{i // 20 + 1}章", level=1)
+        doc.add_paragraph(f"第{i}条 根据本合同，甲方应于内容发布后30日内向乙方支付费用。")
+        if i % 50 == 49:
+            table = doc.add_table(rows=4, cols=4)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"{i}-{r}{c}"
+            table.cell(0, 0).merge(table.cell(0, 1))
+            table.cell(1, 2).merge(table.cell(3, 2))
+    doc.save(str(path))
+
+
+def child(engine: str, path: str, out: str) -> int:
+    """子进程：跑一次提取，把结果 JSON 写到 out，stdout 打印 {seconds, rss_mb}。"""
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    data = read_docx(path, engine=engine)
+    seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    Path(out).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    # ru_maxrss：Linux 单位 KB，macOS 单位字节
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({"seconds": seconds, "rss_mb": (peak - base) * scale / 2**20}))
+    return 0
+
+
+def run(sizes: list[int]) -> list[dict]:
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_read_") as tmp:
+        workdir = Path(tmp)
+        for n in sizes:
+            docx_path = workdir / f"bench_{n}.docx"
+            make_fixture(docx_path, n)
+            row = {"paragraphs": n}
+            outputs = []
+            for engine in ENGINES:
+                out = workdir / f"bench_{n}.{engine}.json"
+                proc = subprocess.run([sys.executable, __file__, "--child", engine, str(docx_path), str(out)],
+                                      capture_output=True, text=True, check=True)
+                stats = json.loads(proc.stdout)
+                row[f"{engine}_s"] = round(stats["seconds"], 3)
+                row[f"{engine}_mb"] = round(stats["rss_mb"], 1)
+                outputs.append(out.read_bytes())
+            row["identical"] = outputs[0] == outputs[1]
+            row["speedup"] = round(row["python-docx_s"] / row["lxml_s"], 1)
+            rows.append(row)
+    return rows
+
+
+def main() -> int:
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        return child(*sys.argv[2:])
+    parser = argparse.ArgumentParser(description="Benchmark read_docx() extraction engines")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated paragraph counts")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+
+    rows = run(sizes)
+    print(f"{'paragraphs':>10} {'docx s':>8} {'lxml s':>8} {'speedup':>8} {'docx MB':>8} {'lxml MB':>8} {'same':>5}")
+    for r in rows:
+        print(f"{r['paragraphs']:>10} {r['python-docx_s']:>8.3f} {r['lxml_s']:>8.3f} {r['speedup']:>7.1f}x "
+              f"{r['python-docx_mb']:>8.1f} {r['lxml_mb']:>8.1f} {'yes' if r['identical'] else 'NO':>5}")
+    return 0 if all(r["identical"] for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""审阅产出（.reviewed.docx）的快速完整性检查，不用开 Word / LibreOffice。
+
+流式读一遍包，检查注入最容易弄坏的几处：
+  1. 正文和页眉/页脚/脚注/尾注里，每个 commentRangeStart 都有同 id 的 commentRangeEnd
+     （同一部件、在它之后）和 commentReference，comments.xml 里有对应的 <w:comment>；
+     反过来没有悬空的 commentRangeEnd、没有从未被引用的 <w:comment>
+  2. commentsExtended / commentsIds / commentsExtensible 的 paraId / durableId 能对上 comments.xml
+  3. 全包 w:ins / w:del 的 w:id 不重复
+  4. [Content_Types].xml 的 Override 都指向存在的部件，每个部件都有内容类型
+  5. 各 .rels 的内部 Target 都存在；包里有的批注部件在 document.xml.rels 里有关系
+  6. 读到的 XML 部件都是良构的（读取时顺带校验 zip CRC）
+
+document.xml 用 iterparse 边读边清，内存与文档大小无关；一份普通合同几毫秒。
+
+用法：
+    python3 check_docx.py output.docx
+    python3 check_docx.py reviewed/*.docx          # CI 门禁：任一文档不通过则退出码非 0
+    python3 check_docx.py output.docx --json
+
+库调用：check_docx() 也接受 docx 的 bytes 或二进制文件对象。
+
+退出码：
+    0 = 全部通过
+    1 = 有文档未通过检查
+    2 = 有文档无法打开（不是 zip / 缺 document.xml）
+
+依赖：lxml
+"""
+
+import argparse
+import io
+import json
+import posixpath
+import re
+import sys
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import unquote
+
+try:
+    from lxml import etree
+except ImportError:
+    print("ERROR: lxml not installed. Run: pip install lxml", file=sys.stderr)
+    sys.exit(1)
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+W14_NS = "http://schemas.microsoft.com/office/word/2010/wordml"
+W15_NS = "http://schemas.microsoft.com/office/word/2012/wordml"
+W16CID_NS = "http://schemas.microsoft.com/office/word/2016/wordml/cid"
+W16CEX_NS = "http://schemas.microsoft.com/office/word/2018/wordml/cex"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+CT_PATH = "[Content_Types].xml"
+DOCUMENT_PATH = "word/document.xml"
+RELS_PATH = "word/_rels/document.xml.rels"
+STORY_PART_RE = re.compile(r"word/(?:header\d+|footer\d+|footnotes|endnotes)\.xml")
+RELS_PART_RE = re.compile(r"(?:(.*)/)?_rels/([^/]+)\.rels")
+COMMENT_PARTS = ("word/comments.xml", "word/commentsExtended.xml",
+                 "word/commentsIds.xml", "word/commentsExtensible.xml")
+
+W_ID = f"{{{W_NS}}}id"
+P_TAG = f"{{{W_NS}}}p"
+# 批注标记 → 在 markers 里的槽位名
+MARKER_KINDS = {
+    f"{{{W_NS}}}commentRangeStart": "start",
+    f"{{{W_NS}}}commentRangeEnd": "end",
+    f"{{{W_NS}}}commentReference": "ref",
+}
+REVISION_TAGS = (f"{{{W_NS}}}ins", f"{{{W_NS}}}del")
+SCAN_TAGS = (P_TAG, *MARKER_KINDS, *REVISION_TAGS)
+
+
+def _scan_story(stream: BinaryIO, part: str, markers: dict[str, dict[str, tuple[str, int]]],
+                revisions: Counter, errors: list[str]) -> int:
+    """iterparse 扫描一个 story 部件，返回段落数。
+
+    批注标记记进 markers {w:id: {"start"/"end"/"ref": (部件, 部件内序号)}}，
+    修订 id 记进 revisions；段落处理完立即清空并删掉已处理的前驱兄弟，内存只留当前路径。
+    """
+    paragraphs = 0
+    seq = 0
+    for _, el in etree.iterparse(stream, events=("end",), tag=SCAN_TAGS, huge_tree=True):
+        if el.tag == P_TAG:
+            paragraphs += 1
+            el.clear(keep_tail=True)
+            parent = el.getparent()
+            while el.getprevious() is not None:
+                del parent[0]
+            continue
+        rid = el.get(W_ID)
+        if el.tag in REVISION_TAGS:
+            revisions[rid] += 1
+            continue
+        seq += 1
+        kind = MARKER_KINDS[el.tag]
+        slot = markers.setdefault(rid, {})
+        if kind in slot:
+            errors.append(f"{part}: duplicate {etree.QName(el).localname} w:id={rid}")
+        else:
+            slot[kind] = (part, seq)
+    return paragraphs
+
+
+def _check_markers(markers: dict[str, dict[str, tuple[str, int]]], comment_ids: set[str],
+                   errors: list[str]) -> None:
+    """批注区间、引用、comments.xml 三方对账。"""
+    referenced = set()
+    for cid, slot in markers.items():
+        start, end, ref = slot.get("start"), slot.get("end"), slot.get("ref")
+        if start:
+            if not end:
+                errors.append(f"{start[0]}: commentRangeStart w:id={cid} has no commentRangeEnd")
+            elif end[0] != start[0]:
+                errors.append(f"commentRange w:id={cid} starts in {start[0]} but ends in {end[0]}")
+            elif end[1] < start[1]:
+                errors.append(f"{start[0]}: commentRangeEnd w:id={cid} precedes its commentRangeStart")
+            if not ref:
+                errors.append(f"{start[0]}: commentRangeStart w:id={cid} has no commentReference")
+        elif end:
+            errors.append(f"{end[0]}: commentRangeEnd w:id={cid} has no commentRangeStart")
+        if (start or ref) and cid not in comment_ids:
+            where = (start or ref)[0]
+            errors.append(f"{where}: comment w:id={cid} is marked but missing from comments.xml")
+        if ref:
+            referenced.add(cid)
+    for cid in sorted(comment_ids - referenced, key=lambda c: (len(c), c)):
+        errors.append(f"word/comments.xml: w:comment w:id={cid} has no commentReference")
+
+
+def _check_comment_parts(zin: zipfile.ZipFile, names: set[str], errors: list[str]) -> set[str]:
+    """解析 comments.xml 及三个扩展部件，返回 <w:comment> 的 id 集合。"""
+    if "word/comments.xml" not in names:
+        return set()
+    root = etree.fromstring(zin.read("word/comments.xml"))
+    ids: Counter = Counter(c.get(W_ID) for c in root.iter(f"{{{W_NS}}}comment"))
+    for cid, n in ids.items():
+        if n > 1:
+            errors.append(f"word/comments.xml: duplicate w:comment w:id={cid}")
+    para_ids = {p.get(f"{{{W14_NS}}}paraId") for p in root.iter(P_TAG)}
+
+    def check_refs(part: str, tag: str, attr: str, known: set[str], known_in: str) -> None:
+        if part not in names:
+            return
+        for el in etree.fromstring(zin.read(part)).iter(tag):
+            if el.get(attr) not in known:
+                errors.append(f"{part}: {etree.QName(tag).localname} {etree.QName(attr).localname}="
+                              f"{el.get(attr)} not found in {known_in}")
+
+    check_refs("word/commentsExtended.xml", f"{{{W15_NS}}}commentEx", f"{{{W15_NS}}}paraId",
+               para_ids, "word/comments.xml")
+    check_refs("word/commentsIds.xml", f"{{{W16CID_NS}}}commentId", f"{{{W16CID_NS}}}paraId",
+               para_ids, "word/comments.xml")
+    if "word/commentsIds.xml" in names:
+        durable_ids = {el.get(f"{{{W16CID_NS}}}durableId") for el in
+                       etree.fromstring(zin.read("word/commentsIds.xml")).iter(f"{{{W16CID_NS}}}commentId")}
+        check_refs("word/commentsExtensible.xml", f"{{{W16CEX_NS}}}commentExtensible",
+                   f"{{{W16CEX_NS}}}durableId", durable_ids, "word/commentsIds.xml")
+    return set(ids)
+
+
+def _check_content_types(zin: zipfile.ZipFile, names: set[str], errors: list[str]) -> None:
+    """每个部件都有内容类型，每个 Override 都指向存在的部件（OPC 部件名不区分大小写）。"""
+    if CT_PATH not in names:
+        errors.append(f"{CT_PATH} is missing")
+        return
+    root = etree.fromstring(zin.read(CT_PATH))
+    defaults = {d.get("Extension", "").lower() for d in root.iter(f"{{{CT_NS}}}Default")}
+    overrides = {o.get("PartName", "").lower(): o.get("PartName") for o in root.iter(f"{{{CT_NS}}}Override")}
+    lowered = {"/" + n.lower() for n in names}
+    for part in sorted(overrides.keys() - lowered):
+        errors.append(f"{CT_PATH}: Override {overrides[part]} points to a missing part")
+    for name in sorted(names):
+        if name == CT_PATH:
+            continue
+        # 不用 splitext：它把 "_rels/.rels" 当成没有扩展名
+        ext = posixpath.basename(name).rpartition(".")[2].lower()
+        if "/" + name.lower() not in overrides and ext not in defaults:
+            errors.append(f"{CT_PATH}: part /{name} has no content type")
+
+
+def _check_rels(zin: zipfile.ZipFile, names: set[str], errors: list[str]) -> None:
+    """所有 .rels 的内部 Target 都存在；包里有的批注部件都挂在 document.xml.rels 上。"""
+    document_targets = set()
+    for rels in sorted(n for n in names if RELS_PART_RE.fullmatch(n)):
+        base = RELS_PART_RE.fullmatch(rels).group(1) or ""
+        root = etree.fromstring(zin.read(rels))
+        for rel in root.iter(f"{{{REL_NS}}}Relationship"):
+            if rel.get("TargetMode") == "External":
+                continue
+            target = unquote(rel.get("Target", ""))
+            path = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+            if path not in names:
+                errors.append(f"{rels}: {rel.get('Id')} Target {target} does not exist")
+            if rels == RELS_PATH:
+                document_targets.add(path)
+    for part in COMMENT_PARTS:
+        if part in names and part not in document_targets:
+            errors.append(f"{RELS_PATH}: no relationship for {part}")
+
+
+def check_docx(source: "str | Path | bytes | BinaryIO") -> tuple[dict, list[str]]:
+    """检查一份 docx，返回 (统计, errors)；errors 为空即通过。
+
+    source 可以是文件路径、docx 的 bytes 或二进制文件对象。
+    不是 zip 或缺 document.xml 时抛 ValueError（整包无法检查，区别于"检查不通过"）。
+    """
+    t0 = time.perf_counter()
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        zin = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"not a docx (zip) package: {e}") from e
+    errors: list[str] = []
+    with zin:
+        names = {n for n in zin.namelist() if not n.endswith("/")}
+        if DOCUMENT_PATH not in names:
+            raise ValueError(f"{DOCUMENT_PATH} is missing")
+
+        markers: dict[str, dict[str, tuple[str, int]]] = {}
+        revisions: Counter = Counter()
+        paragraphs = 0
+        comment_ids: set[str] = set()
+        for part in [DOCUMENT_PATH, *sorted(n for n in names if STORY_PART_RE.fullmatch(n))]:
+            try:
+                with zin.open(part) as stream:
+                    paragraphs += _scan_story(stream, part, markers, revisions, errors)
+            except (etree.XMLSyntaxError, zipfile.BadZipFile) as e:
+                errors.append(f"{part}: unreadable: {e}")
+
+        # 包结构部件都不大，整体解析
+        for label, check in (("comments", _check_comment_parts), ("content types", _check_content_types),
+                             ("relationships", _check_rels)):
+            try:
+                result = check(zin, names, errors)
+            except (etree.XMLSyntaxError, zipfile.BadZipFile) as e:
+                errors.append(f"{label}: unreadable: {e}")
+                continue
+            if label == "comments":
+                comment_ids = result
+
+    _check_markers(markers, comment_ids, errors)
+    for rid, n in sorted(revisions.items(), key=lambda kv: (len(kv[0] or ""), kv[0] or "")):
+        if n > 1:
+            errors.append(f"revision w:id={rid} is used by {n} w:ins/w:del elements")
+
+    stats = {
+        "parts": len(names),
+        "paragraphs": paragraphs,
+        "comments": len(comment_ids),
+        "revisions": sum(revisions.values()),
+        "ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+    return stats, errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the OOXML integrity of reviewed .docx files")
+    parser.add_argument("inputs", nargs="+", help="One or more .docx files")
+    parser.add_argument("--json", action="store_true", help="Print one JSON report per file on stdout")
+    args = parser.parse_args()
+
+    status = 0
+    for path in args.inputs:
+        try:
+            stats, errors = check_docx(path)
+        except (OSError, ValueError) as e:
+            report = {"file": path, "ok": False, "error": str(e)}
+            status = 2
+        else:
+            report = {"file": path, "ok": not errors, **stats, "errors": errors}
+            if errors:
+                status = max(status, 1)
+
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+        elif "error" in report:
+            print(f"ERROR: {path}: {report['error']}", file=sys.stderr)
+        elif errors:
+            print(f"FAIL: {path}: {len(errors)} problems", file=sys.stderr)
+            for err in errors:
+                print(f"  - {err}", file=sys.stderr)
+        else:
+            print(f"OK: {path}: {stats['comments']} comments, {stats['revisions']} revisions, "
+                  f"{stats['paragraphs']} paragraphs ({stats['ms']} ms)", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""对照两个版本的 docx，生成修订 decisions（可直接交给 inject 出红线稿）。
+
+律师常把改好的"干净稿"发回来；这里把它和我们的原稿对齐，翻译成 validate_decisions.py
+schema 的 replace / insert_after / delete，再走 inject() 生成带修订标记的原稿。
+
+  1. 段落对齐：每段原文（与 inject 的 RunIndex 文本一致）映射成整数 id，
+     patience diff 取两边都只出现一次的段落做锚点（LIS 保序），锚点之间递归；
+     没有唯一段落的区间退回 Myers O(ND)。整体 O(n log n)，不是 difflib 的平方级
+  2. 锚点之间的不等区间：按字符二元组相似度做单调配对，配上的当作"改写"，
+     其余是整段删除 / 整段新增
+  3. 只对改写的段落做字符级 Myers diff；相隔不到 MERGE_GAP 个字的改动合并成一处
+  4. 每处改动落成一条 decision：inject 用 str.find 取第一处匹配，所以 match_text
+     向左（不够再向右）扩展到在段落里首次出现的位置恰好是这处改动；
+     扩展会与相邻改动重叠时两处合并
+  5. 新增段落没有"插入段落"动作：接在前一个非空段落末尾，用换行分隔（inject 写成 <w:br/>），
+     批注注明原为独立段落；整段删除只删文字，段落标记保留
+
+只对比正文（word/document.xml），页眉 / 页脚 / 脚注不参与。
+
+用法：
+    python3 compare_docx.py original.docx revised.docx --output decisions.json
+    python3 compare_docx.py original.docx revised.docx --output decisions.json \\
+        --redline original.redline.docx --author 对方律师 --initials 律
+
+依赖：python-docx、lxml
+"""
+
+import argparse
+import bisect
+import io
+import json
+import sys
+import time
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO
+
+# 保证同目录 import 可用
+sys.path.insert(0, str(Path(__file__).parent))
+
+from inject_comments import DOCUMENT_PATH, RunIndex, etree, inject, qn  # noqa: E402
+from validate_decisions import validate  # noqa: E402
+
+# 相隔少于这么多个字的两处改动合并成一处（避免一个字一个修订的碎红线）
+MERGE_GAP = 3
+# 两段的字符二元组 Dice 相似度不低于此值才当作"改写"配对，否则算删除 + 新增
+PAIR_SIMILARITY = 0.3
+# 不等区间超过这个规模（旧段数 × 新段数）时不做相似度配对，按位置配对
+PAIR_DP_LIMIT = 4096
+# 段落级 Myers 的编辑距离上限；超过时整个区间当作不等区间
+ALIGN_MAX_COST = 2000
+
+
+def _myers_pairs(a, b, max_cost: int) -> list[tuple[int, int]] | None:
+    """Myers O(ND) diff，返回匹配的下标对 [(i, j)]（升序）；编辑距离超过 max_cost 时返回 None。
+
+    a / b 是可按下标比较的序列（段落 id 列表或字符串）。公共前缀 / 后缀先剥掉。
+    """
+    n, m = len(a), len(b)
+    head = 0
+    while head < n and head < m and a[head] == b[head]:
+        head += 1
+    tail = 0
+    while tail < n - head and tail < m - head and a[n - 1 - tail] == b[m - 1 - tail]:
+        tail += 1
+    pairs = [(k, k) for k in range(head)]
+    suffix = [(n - tail + k, m - tail + k) for k in range(tail)]
+    a_mid, b_mid = a[head:n - tail], b[head:m - tail]
+    n, m = len(a_mid), len(b_mid)
+    if not n or not m:
+        return pairs + suffix
+
+    v = {1: 0}
+    trace = []  # trace[d]：第 d 步开始前的 v（对角线 k → 最远 x），回溯用
+    done = False
+    for d in range(min(n + m, max_cost) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a_mid[x] == b_mid[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                done = True
+                break
+        if done:
+            break
+    if not done:
+        return None
+
+    # 回溯：每一步 d 的起点来自 trace[d] 里的相邻对角线
+    middle = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v.get(k - 1, -1) < v.get(k + 1, -1)):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v.get(prev_k, 0)
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            middle.append((head + x, head + y))
+        x, y = prev_x, prev_y
+    middle.reverse()
+    return pairs + middle + suffix
+
+
+def _lis(anchors: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """anchors 按 i 升序；取 j 也升序的最长子序列（patience sorting，O(n log n)）。"""
+    tops: list[int] = []        # 每堆顶的 j
+    top_idx: list[int] = []     # 每堆顶在 anchors 里的下标
+    back: list[int] = []
+    for idx, (_, j) in enumerate(anchors):
+        pile = bisect.bisect_left(tops, j)
+        back.append(top_idx[pile - 1] if pile else -1)
+        if pile == len(tops):
+            tops.append(j)
+            top_idx.append(idx)
+        else:
+            tops[pile] = j
+            top_idx[pile] = idx
+    out = []
+    idx = top_idx[-1] if top_idx else -1
+    while idx >= 0:
+        out.append(anchors[idx])
+        idx = back[idx]
+    out.reverse()
+    return out
+
+
+def align(a: list[int], b: list[int]) -> list[tuple[int, int]]:
+    """段落级对齐（patience diff），返回相等段落的下标对 [(i, j)]（两边都升序）。"""
+    pairs: list[tuple[int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            pairs.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            pairs.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        count_a = Counter(a[alo:ahi])
+        count_b = Counter(b[blo:bhi])
+        pos_b = {b[j]: j for j in range(blo, bhi) if count_b[b[j]] == 1}
+        anchors = [(i, pos_b[a[i]]) for i in range(alo, ahi)
+                   if count_a[a[i]] == 1 and a[i] in pos_b]
+        if not anchors:
+            found = _myers_pairs(a[alo:ahi], b[blo:bhi], ALIGN_MAX_COST) or []
+            pairs.extend((alo + i, blo + j) for i, j in found)
+            continue
+        prev_i, prev_j = alo, blo
+        for i, j in _lis(anchors):
+            stack.append((prev_i, i, prev_j, j))
+            pairs.append((i, j))
+            prev_i, prev_j = i + 1, j + 1
+        stack.append((prev_i, ahi, prev_j, bhi))
+    pairs.sort()
+    return pairs
+
+
+def _bigrams(text: str) -> set[str]:
+    return {text[k:k + 2] for k in range(len(text) - 1)} or set(text)
+
+
+def _similarity(x: set[str], y: set[str]) -> float:
+    return 2 * len(x & y) / (len(x) + len(y)) if x or y else 1.0
+
+
+def pair_block(old: list[str], new: list[str]) -> list[tuple[int | None, int | None]]:
+    """锚点之间的不等区间：单调配对旧段和新段，返回按文档顺序的 [(旧下标|None, 新下标|None)]。
+
+    (i, j) 是改写，(i, None) 是整段删除，(None, j) 是整段新增。
+    相似度低于 PAIR_SIMILARITY 的不配对；区间太大时按位置配对。
+    """
+    k, m = len(old), len(new)
+    if k * m > PAIR_DP_LIMIT:
+        out = [(i, i) for i in range(min(k, m))]
+        out += [(i, None) for i in range(m, k)] + [(None, j) for j in range(k, m)]
+        return out
+
+    grams_old = [_bigrams(t) for t in old]
+    grams_new = [_bigrams(t) for t in new]
+    sim = [[_similarity(go, gn) for gn in grams_new] for go in grams_old]
+    score = [[0.0] * (m + 1) for _ in range(k + 1)]
+    for i in range(1, k + 1):
+        for j in range(1, m + 1):
+            best = max(score[i - 1][j], score[i][j - 1])
+            if sim[i - 1][j - 1] >= PAIR_SIMILARITY:
+                best = max(best, score[i - 1][j - 1] + sim[i - 1][j - 1])
+            score[i][j] = best
+
+    out = []
+    i, j = k, m
+    while i or j:
+        if i and j and sim[i - 1][j - 1] >= PAIR_SIMILARITY \
+                and score[i][j] == score[i - 1][j - 1] + sim[i - 1][j - 1]:
+            out.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i and (not j or score[i][j] == score[i - 1][j]):
+            out.append((i - 1, None))
+            i -= 1
+        else:
+            out.append((None, j - 1))
+            j -= 1
+    out.reverse()
+    return out
+
+
+def char_ops(old: str, new: str) -> list[tuple[int, int, str]]:
+    """字符级 diff：返回 [(start, end, 替换文本)]，把 old[start:end] 换成替换文本即得 new。
+
+    相隔不到 MERGE_GAP 个字的改动合并；改动量超过约三分之一时整段替换。
+    """
+    cost = min(max(16, (len(old) + len(new)) // 3), 2000)
+    matches = _myers_pairs(old, new, cost)
+    if matches is None:
+        return [(0, len(old), new)]
+    ops: list[tuple[int, int, str]] = []
+    i = j = 0
+    for mi, mj in matches + [(len(old), len(new))]:
+        if mi > i or mj > j:
+            ops.append((i, mi, new[j:mj]))
+        i, j = mi + 1, mj + 1
+    merged: list[tuple[int, int, str]] = []
+    for a, b, text in ops:
+        if merged and a - merged[-1][1] < MERGE_GAP:
+            pa, pb, ptext = merged.pop()
+            a, text = pa, ptext + old[pb:a] + text
+        merged.append((a, b, text))
+    return merged
+
+
+def _anchor(text: str, a: int, b: int, floor: int, ceiling: int) -> tuple[int, int] | None:
+    """给 text[a:b] 这处改动找 match_text 区间 [a2, b2)：a2 ≤ a、b ≥ b2，且 text.find 恰好落在 a2。
+
+    先向左扩展（不越过 floor，即上一条 decision 的末尾），再向右（不越过 ceiling）。
+    match_text 必须含非空白字符（validate 的要求）。找不到返回 None。
+    """
+    for a2 in range(a, floor - 1, -1):
+        match = text[a2:b]
+        if match.strip() and text.find(match) == a2:
+            return a2, b
+    for a2 in dict.fromkeys((a, floor)):
+        for b2 in range(b + 1, ceiling + 1):
+            match = text[a2:b2]
+            if match.strip() and text.find(match) == a2:
+                return a2, b2
+    return None
+
+
+def _paragraph_decisions(pid: int, text: str, ops: list[tuple[int, int, str, list[str]]]) -> list[dict]:
+    """把一个段落上的改动 [(start, end, 替换文本, 说明)] 落成 decision。
+
+    扩展后的 match_text 会和相邻改动重叠时，与前一处（没有前一处时与后一处）合并再找。
+    """
+    pending = []
+    for a, b, new, notes in sorted(ops, key=lambda op: (op[0], op[1])):  # 同位置 / 相邻的改动先合并
+        if pending and a - pending[-1][1] < MERGE_GAP:
+            pa, pb, pnew, pnotes = pending.pop()
+            a, new, notes = pa, pnew + text[pb:a] + new, pnotes + notes
+        pending.append((a, b, new, notes))
+
+    placed: list[tuple[int, int, int, int, str, list[str]]] = []  # (a2, b2, a, b, new, notes)
+    k = 0
+    while k < len(pending):
+        a, b, new, notes = pending[k]
+        k += 1
+        while True:
+            floor = placed[-1][1] if placed else 0
+            ceiling = pending[k][0] if k < len(pending) else len(text)
+            span = _anchor(text, a, b, floor, ceiling)
+            if span is not None:
+                placed.append((*span, a, b, new, notes))
+                break
+            if placed:
+                _, _, pa, pb, pnew, pnotes = placed.pop()
+                a, new, notes = pa, pnew + text[pb:a] + new, pnotes + notes
+            elif k < len(pending):
+                na, nb, nnew, nnotes = pending[k]
+                k += 1
+                b, new, notes = nb, new + text[b:na] + nnew, notes + nnotes
+            else:
+                break  # 段落里没有可做锚点的文字（全是空白）
+
+    decisions = []
+    for a2, b2, a, b, new, notes in placed:
+        comment = "对照修订稿：" + "；".join(dict.fromkeys(notes))
+        if a == b and b2 == b:
+            action, new_text = "insert_after", new
+        else:
+            new_text = text[a2:a] + new + text[b:b2]
+            action = "replace" if new_text else "delete"
+        decisions.append({
+            "para_id": pid,
+            "match_text": text[a2:b2],
+            "action": action,
+            "new_text": new_text or None,
+            "comment": comment,
+            "severity": "info",
+        })
+    return decisions
+
+
+def paragraph_texts(source: "str | Path | bytes | BinaryIO") -> list[str]:
+    """正文所有段落的文本（与 inject 的 para_id / RunIndex 文本一致）。"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as z:
+        root = etree.fromstring(z.read(DOCUMENT_PATH), parser=etree.XMLParser(huge_tree=True))
+    body = root.find(qn("w:body"))
+    return [RunIndex(p).text for p in body.iter(qn("w:p"))]
+
+
+def compare_texts(old: list[str], new: list[str]) -> tuple[list[dict], dict]:
+    """对照两组段落文本，返回 (decisions, 统计)。decisions 的 para_id 指向 old。"""
+    ids: dict[str, int] = {}
+    a = [ids.setdefault(t, len(ids)) for t in old]
+    b = [ids.setdefault(t, len(ids)) for t in new]
+    matches = align(a, b)
+
+    # 文档顺序的事件：(旧下标|None, 新下标|None, 是否相等)
+    events: list[tuple[int | None, int | None, bool]] = []
+    i = j = 0
+    for mi, mj in matches + [(len(old), len(new))]:
+        if mi > i or mj > j:
+            for pi, pj in pair_block(old[i:mi], new[j:mj]):
+                events.append((None if pi is None else i + pi, None if pj is None else j + pj, False))
+        if mi < len(old):
+            events.append((mi, mj, True))
+        i, j = mi + 1, mj + 1
+
+    stats = Counter()
+    ops: dict[int, list[tuple[int, int, str, list[str]]]] = {}
+    anchor = None          # 最近一个非空旧段落，新增段落接在它末尾
+    waiting: list[str] = []  # 文档开头还没有锚点时的新增段落
+    for oi, nj, equal in events:
+        if not equal and oi is not None and nj is not None and not old[oi].strip():
+            oi = None  # 空白段落里没有可做锚点的文字，改写按新增段落处理
+        if oi is None:
+            stats["inserted"] += 1
+            if not new[nj].strip():
+                continue
+            if anchor is None:
+                waiting.append(new[nj])
+            else:
+                end = len(old[anchor])
+                ops.setdefault(anchor, []).append((end, end, "\n" + new[nj], ["新增段落（原为独立段落）"]))
+            continue
+        if nj is None:
+            stats["deleted"] += 1
+            if old[oi].strip():
+                ops.setdefault(oi, []).append((0, len(old[oi]), "", ["删除整段"]))
+            continue
+
+        if old[oi].strip():
+            anchor = oi
+            if waiting:  # 文档开头的新增段落放在第一个非空段落最前面（先于本段自己的改动）
+                ops.setdefault(oi, []).append((0, 0, "\n".join(waiting) + "\n", ["新增段落（原为独立段落）"]))
+                waiting = []
+        if equal:
+            stats["unchanged"] += 1
+        else:
+            stats["changed"] += 1
+            ops.setdefault(oi, []).extend((s, e, t, ["改写"]) for s, e, t in char_ops(old[oi], new[nj]))
+
+    decisions = []
+    for pid in sorted(ops):
+        decisions.extend(_paragraph_decisions(pid, old[pid], ops[pid]))
+    stats["decisions"] = len(decisions)
+    stats["unplaced"] = len(waiting)
+    return decisions, dict(stats)
+
+
+def compare_docx(original: "str | Path | bytes | BinaryIO", revised: "str | Path | bytes | BinaryIO",
+                 mode: str = "general") -> tuple[dict, dict]:
+    """对照两个 docx，返回 ({"mode", "decisions"}, 统计)；decisions 指向 original 的段落。"""
+    decisions, stats = compare_texts(paragraph_texts(original), paragraph_texts(revised))
+    return {"mode": mode, "decisions": decisions}, stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Turn an edited copy of a .docx into tracked-change decisions")
+    parser.add_argument("original", help="Our original .docx (decisions point at its paragraphs)")
+    parser.add_argument("revised", help="Edited clean copy")
+    parser.add_argument("--output", "-o", help="Output decisions JSON (default: stdout)")
+    parser.add_argument("--redline", help="Also inject the decisions into the original and write this .docx")
+    parser.add_argument("--mode", default="general", help="mode field of the decisions JSON (default: general)")
+    parser.add_argument("--author", default="Claude AI Reviewer", help="Author name for --redline")
+    parser.add_argument("--initials", default="AI", help="Author initials for --redline")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    try:
+        result, stats = compare_docx(args.original, args.revised, mode=args.mode)
+    except Exception as e:
+        print(f"ERROR: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - t0
+
+    _, errors = validate(result)
+    for err in errors:
+        print(f"WARN: generated decision failed validation: {err}", file=sys.stderr)
+
+    out = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(out, encoding="utf-8")
+        print(f"Wrote: {args.output}", file=sys.stderr)
+    else:
+        print(out)
+    print(f"{stats.get('unchanged', 0)} unchanged, {stats.get('changed', 0)} changed, "
+          f"{stats.get('deleted', 0)} deleted, {stats.get('inserted', 0)} inserted paragraphs "
+          f"-> {stats['decisions']} decisions ({elapsed:.2f}s)", file=sys.stderr)
+    if stats["unplaced"]:
+        print(f"WARN: {stats['unplaced']} inserted paragraphs have no anchor paragraph and were dropped",
+              file=sys.stderr)
+
+    if args.redline:
+        summary = inject(args.original, result["decisions"], args.redline,
+                         author=args.author, initials=args.initials)
+        print(f"Redline: {summary['output']} ({summary['success']} applied, {summary['skipped']} skipped)",
+              file=sys.stderr)
+        if summary["skipped"]:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
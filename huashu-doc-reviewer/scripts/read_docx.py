@@ -1,94 +1,792 @@
 #!/usr/bin/env python3
 """读取 docx 并输出结构化 JSON，给模型做"判断"。
 
-模型只看到 {paragraphs: [...], tables: [...]}，
-不碰 XML、不碰格式、不碰原文件。
+模型只看到 {paragraphs: [...], tables: [...], parts: [...]}，
+不碰 XML、不碰格式、不碰原文件。parts 是页眉/页脚/脚注/尾注里的段落，
+decision 用 part + para_id 指向它们。表格单元格里的段落在 tables[].cells[].paragraphs，
+id 与正文段落同一套编号，decision 直接用 para_id 指向。
+
+两个提取引擎，输出逐字节相同：
+  - lxml（默认）：iterparse 流式读 word/document.xml，正文段落 / 表格处理完立即释放；
+    样式名只查一次 styles.xml。不建 python-docx 的段落 / run / 单元格代理对象
+  - python-docx：原实现，作为对照（bench_read.py 用它做基准）
 
 用法：
     python3 read_docx.py <file.docx>
     python3 read_docx.py <file.docx> --output doc.json
     python3 read_docx.py <file.docx> --for-model   # 给模型的精简版（无 full_text）
     python3 read_docx.py <file.docx> --max-paragraph-chars 2000  # 超长段落截断
+    python3 read_docx.py <file.docx> --engine python-docx
+    python3 read_docx.py <file.docx> --for-model --chunk-tokens 6000 --output doc.json  # 分块：doc.1.json, doc.2.json ...
+    python3 read_docx.py v3.docx --for-model --previous v2.docx --id-map v3.idmap.json  # 只出新增 / 改写的段落
+    python3 read_docx.py <file.docx> --ndjson | next_stage   # 边提取边逐行输出，stats 在最后一行；下游提前关管道时静默退出（141）
+    python3 read_docx.py <file.docx> --for-model --index     # 顺带写 <file.docx>.pidx，inject 按它直达目标段落
+    python3 read_docx.py <file.docx> --for-model --encoding compact   # 样式字典 + id|样式号|正文 行，token 约省三到五成
+    python3 read_docx.py <file.docx> --for-model --estimate  # 只报告各编码的字符数 / 估算 token 数
+
+库调用：read_docx() 也接受 docx 的 bytes 或二进制文件对象（服务端不必落盘）。
 
 依赖：python-docx（pip install python-docx）
 """
 
 import argparse
+import hashlib
+import io
 import json
+import os
+import posixpath
+import re
 import sys
+import zipfile
+from collections import Counter, deque
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
 
 try:
     from docx import Document
+    from docx.styles import BabelFish
+    from lxml import etree
 except ImportError:
     print("ERROR: python-docx not installed. Run: pip install python-docx", file=sys.stderr)
     sys.exit(1)
 
+# 保证同目录 import 可用
+sys.path.insert(0, str(Path(__file__).parent))
+
+from compare_docx import align, pair_block  # noqa: E402
+from inject_comments import ParagraphIndex, docx_digest, index_path  # noqa: E402
+
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+STORY_PART_RE = re.compile(r"word/(?:header\d+|footer\d+|footnotes|endnotes)\.xml")
+ENGINES = ("lxml", "python-docx")
+# 分块时优先在这些样式的段落前切开
+HEADING_STYLE_RE = re.compile(r"^(?:Heading|Title|标题)", re.IGNORECASE)
+
+W = f"{{{W_NS}}}"
+W_BODY, W_P, W_R, W_T, W_BR, W_TBL, W_TR, W_TC = (
+    W + t for t in ("body", "p", "r", "t", "br", "tbl", "tr", "tc"))
+W_VAL = W + "val"
+# run 内与 python-docx Run.text 等价的字符元素（w:br 另按 type 处理）
+_RUN_CHARS = {W + "tab": "\t", W + "ptab": "\t", W + "cr": "\n", W + "noBreakHyphen": "-"}
+
+
+def _truncate(text: str, max_paragraph_chars: int) -> str:
+    if max_paragraph_chars and len(text) > max_paragraph_chars:
+        return text[:max_paragraph_chars] + f"...[truncated {len(text) - max_paragraph_chars} chars]"
+    return text
+
+
+def _story_parts(blobs: Iterable[tuple[str, bytes]], max_paragraph_chars: int = 0) -> list[dict]:
+    """页眉/页脚/脚注/尾注部件里的非空段落，按部件名排序。
+
+    blobs 是 [(部件名, 字节)]，只取名字匹配 STORY_PART_RE 的部件。
+    id 是段落在该部件所有 <w:p> 中的下标（与 inject 的 part + para_id 一致）；
+    文本只取段落直接子 run，与 inject 能定位的文本一致。
+    """
+    parts = []
+    for name, blob in blobs:
+        if not STORY_PART_RE.fullmatch(name):
+            continue
+        paragraphs = []
+        for idx, p in enumerate(etree.fromstring(blob).iter(W_P)):
+            text = "".join(t.text or "" for r in p.iterchildren(W_R) for t in r.iter(W_T))
+            if not text.strip():
+                continue
+            paragraphs.append({"id": idx, "text": _truncate(text, max_paragraph_chars)})
+        if paragraphs:
+            parts.append({"part": name, "paragraphs": paragraphs})
+    return sorted(parts, key=lambda p: p["part"])
+
+
+# --- python-docx 引擎 ---
+#
+# 两个引擎都是生成器，按文档顺序产出 ("p", (para_id, 文本, 样式名)) / ("tbl", (行列表, 单元格, 列数))，
+# 最后产出 ("parts", [(部件名, 字节)])。para_id 是段落在 body.iter("w:p") 中的下标，
+# 与 inject 的编号一致（表格单元格里的段落也占号）；index 不为 None 时顺带登记段落索引
+
+def _extract_python_docx(src, index: ParagraphIndex | None = None) -> Iterator[tuple[str, object]]:
+    doc = Document(src)
+    body = doc.element.body
+    pids = {p: pid for pid, p in enumerate(body.iter(W_P))}
+    if index is not None:
+        index.add_body(body)
+    for block in doc.iter_inner_content():
+        if hasattr(block, "rows"):
+            _, cells, width = _walk_table(block._element, pids)
+            yield "tbl", ([[cell.text for cell in row.cells] for row in block.rows], cells, width)
+        else:
+            yield "p", (pids[block._element], block.text or "", block.style.name if block.style else "Normal")
+    yield "parts", [(str(part.partname).lstrip("/"), part.blob) for part in doc.part.package.iter_parts()]
+
+
+# --- lxml 流式引擎：与 python-docx 的 Paragraph.text / style.name / _Row.cells 语义一致 ---
+
+def _run_text(r: etree._Element) -> str:
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag == W_BR:
+            # 只有换行（缺省 type）算 "\n"，分页 / 分栏符为空
+            if child.get(W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in _RUN_CHARS:
+            parts.append(_RUN_CHARS[tag])
+    return "".join(parts)
+
+
+def _paragraph_text(p: etree._Element) -> str:
+    """段落直接子 run + 超链接里的 run，与 python-docx Paragraph.text 相同。"""
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W + "hyperlink":
+            parts.extend(_run_text(r) for r in child if r.tag == W_R)
+    return "".join(parts)
+
+
+def _related(z: zipfile.ZipFile, source: str, rel_type: str) -> str | None:
+    """source 部件的 .rels 里第一个 rel_type 类型关系指向的部件名；没有时返回 None。"""
+    base, name = posixpath.split(source)
+    rels = posixpath.join(base, "_rels", name + ".rels")
+    try:
+        root = etree.fromstring(z.read(rels))
+    except KeyError:
+        return None
+    for rel in root.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type", "").endswith("/" + rel_type) and rel.get("TargetMode") != "External":
+            target = rel.get("Target", "")
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+    return None
+
+
+def _paragraph_styles(z: zipfile.ZipFile, document: str) -> tuple[dict[str, str | None], str | None]:
+    """一次读完 styles.xml：返回 ({段落样式 id: 显示名}, 默认段落样式名)。
+
+    与 python-docx 的 para.style.name 一致：同 id 只看第一个 <w:style>，它不是段落样式时
+    按默认样式处理；默认样式取最后一个 w:default 为真的段落样式，一个都没有时
+    read_docx 记为 "Normal"；显示名经 BabelFish 转换（"heading 1" → "Heading 1"）。
+    没有 styles 部件时 python-docx 用内置模板，默认样式同样是 Normal。
+    """
+    path = _related(z, document, "styles")
+    if path is None or path not in z.namelist():
+        return {}, "Normal"
+    first: dict[str, etree._Element] = {}
+    default = "Normal"
+    for style in etree.fromstring(z.read(path)).iterchildren(W + "style"):
+        first.setdefault(style.get(W + "styleId"), style)
+        if style.get(W + "type") == "paragraph" and style.get(W + "default") in ("1", "true", "on"):
+            default = _style_name(style)
+    names = {sid: _style_name(style) for sid, style in first.items()
+             if style.get(W + "type") == "paragraph"}
+    return names, default
+
+
+def _style_name(style: etree._Element) -> str | None:
+    name_el = style.find(W + "name")
+    return BabelFish.internal2ui(name_el.get(W_VAL)) if name_el is not None else None
+
+
+def _int_prop(el: etree._Element | None, path: str, default: int) -> int:
+    found = el.find(path) if el is not None else None
+    return int(found.get(W_VAL, default)) if found is not None else default
+
+
+def _walk_table(tbl: etree._Element, pids: dict[etree._Element, int]) -> tuple[list[list[str]], list[dict], int]:
+    """一遍走完 w:tr / w:tc，返回 (rows, cells, 网格列数)。
+
+    rows 与 python-docx 的 [cell.text for cell in row.cells] 相同：横向合并（gridSpan）的单元格按跨的列数重复，
+    纵向合并的续格（vMerge continue）取上方同一网格列起始格的文本。
+    cells 是合并后的矩形单元格（只列起始格）：{row, col, rowspan, colspan, paragraphs: [{id, text}]}，
+    col 是网格列号（含 gridBefore），段落 id 来自 pids（body.iter 的编号）。
+    上一行按网格列记住已解析的起始格，续格 O(1) 找到它，长的纵向合并不会递归。
+    """
+    rows: list[list[str]] = []
+    cells: list[dict] = []
+    width = 0
+    above: dict[int, tuple[list[str], dict]] = {}  # 上一行：网格列 → (该格在 rows 里的文本, 起始格)
+    for r_idx, tr in enumerate(tr for tr in tbl if tr.tag == W_TR):
+        offset = _int_prop(tr.find(W + "trPr"), W + "gridBefore", 0)
+        row: list[str] = []
+        current: dict[int, tuple[list[str], dict]] = {}
+        for tc in tr.iterchildren(W_TC):
+            tc_pr = tc.find(W + "tcPr")
+            span = _int_prop(tc_pr, W + "gridSpan", 1)
+            merge = tc_pr.find(W + "vMerge") if tc_pr is not None else None
+            if merge is not None and merge.get(W_VAL, "continue") == "continue" and offset in above:
+                texts, origin = above[offset]
+                origin["rowspan"] = r_idx - origin["row"] + 1
+            else:
+                # 上一行没有同列起始的格时 python-docx 会抛 ValueError；此处按普通单元格处理
+                paragraphs = [{"id": pids[p], "text": _paragraph_text(p)} for p in tc.iterchildren(W_P)]
+                texts = ["\n".join(p["text"] for p in paragraphs)] * span
+                origin = {"row": r_idx, "col": offset, "rowspan": 1, "colspan": span, "paragraphs": paragraphs}
+                cells.append(origin)
+            row += texts
+            current[offset] = (texts, origin)
+            offset += span
+        rows.append(row)
+        width = max(width, offset)
+        above = current
+    return rows, cells, width
+
+
+def _body_path(el: etree._Element, removed: int) -> list[int]:
+    """iterparse 中元素的路径（从 <w:body> 起逐层的子节点下标）；body 层要加回已删掉的 removed 个。
+
+    iterparse 会预读，事件送达时树里可能已有后面的兄弟节点，所以用 index() 而不是 len() 取下标。
+    """
+    path = []
+    parent = el.getparent()
+    while parent is not None:
+        path.append(parent.index(el))
+        if parent.tag == W_BODY:
+            path[-1] += removed
+            break
+        el, parent = parent, parent.getparent()
+    path.reverse()
+    return path
+
+
+def _extract_lxml(src, index: ParagraphIndex | None = None) -> Iterator[tuple[str, object]]:
+    with zipfile.ZipFile(src) as z:
+        document = _related(z, "", "officeDocument") or "word/document.xml"
+        styles, default_style = _paragraph_styles(z, document)
+        with z.open(document) as f:
+            # 所有 <w:p> 按开始顺序编号（= body.iter 的先序）；段落可经文本框嵌套，用栈配对 start / end。
+            # 只输出 body 的直接子段落 / 表格（与 doc.paragraphs / doc.tables 一致）；
+            # 表格里的段落等到整张表结束再处理，处理完的兄弟元素立即删掉
+            next_pid = 0
+            open_paras: list[int] = []
+            nested: dict[etree._Element, int] = {}
+            removed = 0
+            for event, el in etree.iterparse(f, events=("start", "end"), tag=(W_P, W_TBL), huge_tree=True):
+                if event == "start":
+                    if el.tag == W_P:
+                        open_paras.append(next_pid)
+                        next_pid += 1
+                    continue
+                if el.tag == W_P:
+                    pid = open_paras.pop()
+                    if index is not None:
+                        index.add(pid, _body_path(el, removed), el)
+                parent = el.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    if el.tag == W_P:
+                        nested[el] = pid  # 表格里的段落，整张表结束时取 id
+                    continue
+                if el.tag == W_P:
+                    style_el = el.find(f"{W}pPr/{W}pStyle")
+                    style_id = style_el.get(W_VAL) if style_el is not None else None
+                    style = styles[style_id] if style_id in styles else default_style
+                    yield "p", (pid, _paragraph_text(el), style)
+                else:
+                    yield "tbl", _walk_table(el, nested)
+                    nested.clear()
+                el.clear(keep_tail=True)
+                while el.getprevious() is not None:
+                    del parent[0]
+                    removed += 1
+        yield "parts", [(name, z.read(name)) for name in z.namelist() if STORY_PART_RE.fullmatch(name)]
+
+
+def iter_docx(path: "str | Path | bytes | BinaryIO", max_paragraph_chars: int = 0,
+              engine: str = "lxml", index: ParagraphIndex | None = None) -> Iterator[dict]:
+    """边提取边产出紧凑记录（--ndjson 的每一行），按文档顺序：
 
-def read_docx(path: str, max_paragraph_chars: int = 0) -> dict:
-    """读取 docx 文件，返回结构化字典。
+      {"type": "paragraph", "id", "text", "style"[, "full_text"]}   正文段落；full_text 仅在被截断时出现
+      {"type": "table", "id", "shape", "rows", "cells"}                行数 × 网格列数；cells 见 _walk_table
+      {"type": "paragraph", "part", "id", "text"}                   页眉/页脚/脚注/尾注的非空段落
+      {"type": "stats", "source", "paragraph_count", "table_count", "total_chars"}   最后一条
 
+    正文段落的 id 是它在 body.iter("w:p") 中的下标（与 inject 的 para_id 一致），
+    所以正文有表格时 id 不连续：表格单元格里的段落也占号，id 在 cells[].paragraphs 里，decision 可直接指向。
+    参数与 read_docx() 相同；read_docx() 就是把这些记录收拢成一个字典。
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}, got {engine!r}")
+    if isinstance(path, (bytes, bytearray)):
+        src = io.BytesIO(path)
+        source = None
+    elif hasattr(path, "read"):
+        src = path
+        source = None
+    else:
+        p = Path(path)
+        if not p.exists():
+            raise FileNotFoundError(f"File not found: {path}")
+        if p.suffix.lower() != ".docx":
+            raise ValueError(f"Expected .docx, got: {p.suffix}")
+        src = str(p)
+        source = str(p.resolve())
+
+    extract = _extract_lxml if engine == "lxml" else _extract_python_docx
+    paragraph_count = table_count = total_chars = 0
+    for kind, payload in extract(src, index):
+        if kind == "p":
+            pid, text, style = payload
+            total_chars += len(text)
+            record = {"type": "paragraph", "id": pid,
+                      "text": _truncate(text, max_paragraph_chars), "style": style}
+            if record["text"] != text:
+                record["full_text"] = text  # 完整文本（代码注入时用这个定位）
+            paragraph_count += 1
+            yield record
+        elif kind == "tbl":
+            rows, cells, width = payload
+            yield {"type": "table", "id": table_count, "shape": [len(rows), width], "rows": rows, "cells": cells}
+            table_count += 1
+        else:
+            for part in _story_parts(payload, max_paragraph_chars):
+                for para in part["paragraphs"]:
+                    yield {"type": "paragraph", "part": part["part"], **para}
+
+    yield {"type": "stats", "source": source, "paragraph_count": paragraph_count,
+           "table_count": table_count, "total_chars": total_chars}
+
+
+def read_docx(path: "str | Path | bytes | BinaryIO", max_paragraph_chars: int = 0,
+              engine: str = "lxml", index: ParagraphIndex | None = None) -> dict:
+    """读取 docx，返回结构化字典。
+
+    path 可以是文件路径，也可以是 docx 的 bytes / 二进制文件对象（此时 source 为 None）。
     max_paragraph_chars > 0 时，超长段落会被截断（在提示给模型时避免 context 爆炸）。
     注入批注时用的是完整段落文本，不受截断影响。
+    engine 为 "lxml"（默认，流式）或 "python-docx"，两者输出相同。
+    index 不为 None 时提取过程中顺带把正文段落登记进去（之后 save 成 inject 用的 sidecar）。
     """
-    p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"File not found: {path}")
-    if p.suffix.lower() != ".docx":
-        raise ValueError(f"Expected .docx, got: {p.suffix}")
-
-    doc = Document(str(p))
-
-    paragraphs = []
-    total_chars = 0
-    for idx, para in enumerate(doc.paragraphs):
-        text = para.text or ""
-        total_chars += len(text)
-        display_text = text
-        if max_paragraph_chars and len(text) > max_paragraph_chars:
-            display_text = text[:max_paragraph_chars] + f"...[truncated {len(text) - max_paragraph_chars} chars]"
-        paragraphs.append({
-            "id": idx,
-            "text": display_text,
-            "full_text": text,  # 完整文本（代码注入时用这个定位）
-            "style": para.style.name if para.style else "Normal",
-        })
-
-    tables = []
-    for t_idx, table in enumerate(doc.tables):
-        rows = []
-        for row in table.rows:
-            rows.append([cell.text for cell in row.cells])
-        tables.append({
-            "id": t_idx,
-            "rows": rows,
-        })
+    paragraphs: list[dict] = []
+    tables: list[dict] = []
+    parts: dict[str, list[dict]] = {}
+    for record in iter_docx(path, max_paragraph_chars, engine, index):
+        kind = record.pop("type")
+        if kind == "paragraph" and "part" in record:
+            parts.setdefault(record.pop("part"), []).append(record)
+        elif kind == "paragraph":
+            paragraphs.append({
+                "id": record["id"],
+                "text": record["text"],
+                "full_text": record.get("full_text", record["text"]),  # 完整文本（代码注入时用这个定位）
+                "style": record["style"],
+            })
+        elif kind == "table":
+            tables.append(record)
+        else:
+            source = record.pop("source")
+            stats = record
 
     return {
-        "source": str(p.resolve()),
+        "source": source,
         "paragraphs": paragraphs,
         "tables": tables,
-        "stats": {
-            "paragraph_count": len(paragraphs),
-            "table_count": len(tables),
-            "total_chars": total_chars,
-        },
+        "parts": [{"part": name, "paragraphs": paras} for name, paras in parts.items()],
+        "stats": stats,
     }
 
 
-def to_model_prompt(data: dict) -> str:
-    """生成给模型看的精简版——剥掉 full_text，不含空段落。"""
-    slim_paras = [
+def _slim_paragraphs(data: dict) -> list[dict]:
+    """给模型看的正文段落：剥掉 full_text，不含空段落。"""
+    return [
         {"id": p["id"], "text": p["text"], "style": p["style"]}
         for p in data["paragraphs"]
         if (p["text"] or "").strip()
     ]
+
+
+def _slim_tables(data: dict) -> list[dict]:
+    """给模型看的表格：只留合并后的单元格和其中的非空段落（带 id，decision 可直接指向），
+    rowspan / colspan 为 1 时省略；rows 与 cells 重复，不发。"""
+    tables = []
+    for t in data["tables"]:
+        cells = []
+        for c in t["cells"]:
+            paragraphs = [p for p in c["paragraphs"] if p["text"].strip()]
+            if not paragraphs:
+                continue
+            cell = {"row": c["row"], "col": c["col"]}
+            cell.update((k, c[k]) for k in ("rowspan", "colspan") if c[k] > 1)
+            cell["paragraphs"] = paragraphs
+            cells.append(cell)
+        tables.append({"id": t["id"], "shape": t["shape"], "cells": cells})
+    return tables
+
+
+def to_model_prompt(data: dict, encoding: str = "json") -> str:
+    """生成给模型看的精简版——剥掉 full_text，不含空段落。encoding 见 encode_for_model。"""
     slim = {
-        "paragraphs": slim_paras,
-        "tables": data["tables"],
+        "paragraphs": _slim_paragraphs(data),
+        "tables": _slim_tables(data),
         "stats": data["stats"],
     }
-    return json.dumps(slim, ensure_ascii=False, indent=2)
+    if data.get("parts"):
+        slim["parts"] = data["parts"]
+    return encode_for_model(slim, encoding)
+
+
+# --- 给模型的编码（--encoding） ---
+#
+# json 每段都重复 "id" / "text" / "style" 键名、缩进和完整样式名，长合同里这部分占到提示的三四成。
+# compact 是逐行文本：样式名进字典只列一次，段落写成 id|样式号|正文，最常见的样式号留空。
+# id 与 json 完全相同，模型产出的 decisions 不受编码影响。
+
+MODEL_ENCODINGS = ("json", "compact")
+
+COMPACT_FORMAT = "#format id|样式号|正文（空=0）；#part 下 id|正文；#table 下 id|行,列[ 跨行x跨列]|正文；\\n=换行"
+
+
+def _compact_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _compact_lines(stream: str | None, item: dict, style_ids: dict) -> list[str]:
+    """一个条目（stream 含义同 chunk_for_model）编码成的行。"""
+    if stream is None:
+        sid = style_ids.get(item["style"], 0)
+        return [f"{item['id']}|{sid or ''}|{_compact_text(item['text'])}"]
+    if stream != "tables":
+        return [f"{item['id']}|{_compact_text(item['text'])}"]
+    lines = [f"#table {item['id']} {item['shape'][0]}x{item['shape'][1]}"]
+    for c in item["cells"]:
+        pos = f"{c['row']},{c['col']}"
+        if "rowspan" in c or "colspan" in c:
+            pos += f" {c.get('rowspan', 1)}x{c.get('colspan', 1)}"
+        lines += [f"{p['id']}|{pos}|{_compact_text(p['text'])}" for p in c["paragraphs"]]
+    return lines
+
+
+def _style_ids(paragraphs: Iterable[dict]) -> dict[str | None, int]:
+    """样式名 → 样式号，按出现次数降序（最常见的是 0，行里留空）。"""
+    counts = Counter(p["style"] for p in paragraphs)
+    return {name: i for i, (name, _) in enumerate(counts.most_common())}
+
+
+def encode_compact(slim: dict) -> str:
+    """to_model_prompt / chunk_for_model 的结构编码成逐行文本，格式见 COMPACT_FORMAT。"""
+    context = slim.get("context") or []
+    style_ids = _style_ids([p for p in context if "part" not in p] + slim["paragraphs"])
+    lines = [COMPACT_FORMAT]
+    if style_ids:
+        lines.append("#styles " + ";".join(f"{i}={name or ''}" for name, i in style_ids.items()))
+    lines.append("#stats " + json.dumps(slim["stats"], ensure_ascii=False, separators=(",", ":")))
+    if "chunk" in slim:
+        lines.append(f"#chunk {slim['chunk']['index'] + 1}/{slim['chunk']['count']}")
+    if context:
+        part = context[0].get("part")
+        lines.append(f"#context {part}" if part else "#context")
+        for p in context:
+            lines += _compact_lines(p.get("part"), p, style_ids)
+    if slim["paragraphs"]:
+        lines.append("#paragraphs")
+        for p in slim["paragraphs"]:
+            lines += _compact_lines(None, p, style_ids)
+    for part in slim.get("parts") or []:
+        lines.append(f"#part {part['part']}")
+        for p in part["paragraphs"]:
+            lines += _compact_lines(part["part"], p, style_ids)
+    for t in slim["tables"]:
+        lines += _compact_lines("tables", t, style_ids)
+    return "\n".join(lines) + "\n"
+
+
+def encode_for_model(slim: dict, encoding: str = "json") -> str:
+    """json：indent=2 的 JSON（默认，与原输出相同）；compact：逐行文本，token 约省三到五成。"""
+    if encoding == "json":
+        return json.dumps(slim, ensure_ascii=False, indent=2)
+    if encoding == "compact":
+        return encode_compact(slim)
+    raise ValueError(f"unknown encoding {encoding!r}, expected one of {MODEL_ENCODINGS}")
+
+
+# --- 与上一版的增量（--previous） ---
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _diff_paragraphs(old: list[dict], new: list[dict]) -> dict:
+    """按内容哈希对齐新旧两组非空段落，返回该组的 delta。
+
+    1. 哈希序列做 patience diff（compare_docx.align），对上的是原位未变的段落
+    2. 没对上的新段落，哈希在没对上的旧段落里出现过 → 移动（内容未变，不必重审）
+    3. 剩下的在相邻锚点之间按相似度单调配对（compare_docx.pair_block）：配上的是改写，
+       其余新段落是新增、旧段落是删除
+    id_map 覆盖未变、移动、改写三类（旧 id → 新 id）。
+    """
+    def key(p: dict) -> str:
+        return p.get("full_text", p["text"])
+
+    ids: dict[str, int] = {}
+    a = [ids.setdefault(_text_hash(key(p)), len(ids)) for p in old]
+    b = [ids.setdefault(_text_hash(key(p)), len(ids)) for p in new]
+    matches = align(a, b)
+    used_old = {i for i, _ in matches}
+    used_new = {j for _, j in matches}
+
+    pool: dict[int, deque[int]] = {}
+    for i in range(len(old)):
+        if i not in used_old:
+            pool.setdefault(a[i], deque()).append(i)
+    moved = []
+    for j in range(len(new)):
+        if j not in used_new and pool.get(b[j]):
+            i = pool[b[j]].popleft()
+            moved.append((i, j))
+            used_old.add(i)
+            used_new.add(j)
+
+    changed, added, removed = [], [], []
+    i = j = 0
+    for mi, mj in matches + [(len(old), len(new))]:
+        rest_old = [k for k in range(i, mi) if k not in used_old]
+        rest_new = [k for k in range(j, mj) if k not in used_new]
+        if rest_old or rest_new:
+            pairs = pair_block([key(old[k]) for k in rest_old], [key(new[k]) for k in rest_new])
+            for pi, pj in pairs:
+                if pi is None:
+                    added.append(rest_new[pj])
+                elif pj is None:
+                    removed.append(rest_old[pi])
+                else:
+                    changed.append((rest_old[pi], rest_new[pj]))
+        i, j = mi + 1, mj + 1
+
+    def pid(group: list[dict], k: int) -> int:
+        return group[k]["id"]
+
+    id_map = {pid(old, oi): pid(new, nj) for oi, nj in matches + moved + changed}
+    return {
+        "id_map": {str(k): v for k, v in sorted(id_map.items())},
+        "moved": sorted([pid(old, oi), pid(new, nj)] for oi, nj in moved),
+        "changed": sorted([pid(old, oi), pid(new, nj)] for oi, nj in changed),
+        "added": sorted(pid(new, nj) for nj in added),
+        "removed": sorted(pid(old, oi) for oi in removed),
+        "unchanged": len(matches),
+    }
+
+
+def diff_extraction(previous: dict, data: dict) -> dict:
+    """只保留相对 previous 新增或改写的段落 / 表格，结构与 read_docx() 的输出相同。
+
+    previous 是上一版的 read_docx() 输出（--for-model 的精简版也行，但被截断的长段落会被当作改写）。
+    返回的 paragraphs / parts / tables 只含要重审的条目，id 是新版的全局 id，
+    可以直接交给 to_model_prompt() / chunk_for_model()；另加 "delta"：
+      {"body": 正文的 {id_map, moved, changed, added, removed, unchanged},
+       "<部件名>": 同上, "tables": {"added": [新表 id], "removed": [旧表 id]}}
+    表格按整表内容哈希匹配，内容变了就整表重发。
+    """
+    def nonblank(paragraphs: list[dict]) -> list[dict]:
+        return [p for p in paragraphs if (p.get("full_text", p["text"]) or "").strip()]
+
+    body = _diff_paragraphs(nonblank(previous["paragraphs"]), nonblank(data["paragraphs"]))
+    delta = {"body": body}
+    keep = set(body["added"]) | {n for _, n in body["changed"]}
+    paragraphs = [p for p in data["paragraphs"] if p["id"] in keep]
+
+    old_parts = {part["part"]: part["paragraphs"] for part in previous.get("parts") or []}
+    new_parts = {part["part"]: part["paragraphs"] for part in data["parts"]}
+    parts = []
+    for name in sorted(old_parts.keys() | new_parts.keys()):
+        part_delta = _diff_paragraphs(old_parts.get(name, []), new_parts.get(name, []))
+        delta[name] = part_delta
+        keep = set(part_delta["added"]) | {n for _, n in part_delta["changed"]}
+        if keep:
+            parts.append({"part": name, "paragraphs": [p for p in new_parts[name] if p["id"] in keep]})
+
+    def table_hash(t: dict) -> str:
+        return _text_hash(json.dumps(t["rows"], ensure_ascii=False))
+
+    pool: dict[str, deque[int]] = {}
+    for t in previous.get("tables") or []:
+        pool.setdefault(table_hash(t), deque()).append(t["id"])
+    tables = []
+    for t in data["tables"]:
+        if pool.get(table_hash(t)):
+            pool[table_hash(t)].popleft()
+        else:
+            tables.append(t)
+    delta["tables"] = {"added": [t["id"] for t in tables], "removed": sorted(i for q in pool.values() for i in q)}
+
+    return {
+        "source": data["source"],
+        "previous": previous.get("source"),
+        "paragraphs": paragraphs,
+        "tables": tables,
+        "parts": parts,
+        "stats": data["stats"],
+        "delta": delta,
+    }
+
+
+# --- 按 token 预算分块（--chunk-tokens） ---
+
+# 条目在 indent=2 输出里的嵌套深度：paragraphs / tables / context 的元素在第 2 层，
+# parts[].paragraphs 的元素在第 4 层
+_ITEM_DEPTH = 2
+_PART_ITEM_DEPTH = 4
+# 分块外壳（chunk 元信息、stats、键名）
+_CHUNK_OVERHEAD = 64
+_WIDE_CHARS_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 数：CJK / 全角字符按 1 字 1 token，其余按 4 字符 1 token。
+
+    不依赖具体 tokenizer，用来控制分块大小，宁可略偏大。
+    """
+    wide = len(_WIDE_CHARS_RE.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _item_tokens(item: dict, depth: int = _ITEM_DEPTH) -> int:
+    """条目在 encode_for_model(json) 里的 token 数：按同样的 indent=2 序列化，
+    每行再加上所在嵌套深度的缩进，外加结尾的逗号和换行。表格嵌套深，缩进往往比正文还多。"""
+    pad = " " * (2 * depth)
+    text = pad + json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n" + pad) + ",\n"
+    return estimate_tokens(text)
+
+
+def _compact_item_tokens(stream: str | None, item: dict, style_ids: dict) -> int:
+    # 每行一个换行符；部件 / 上下文切换时的 # 行摊进 _CHUNK_OVERHEAD
+    return sum(estimate_tokens(line) + 1 for line in _compact_lines(stream, item, style_ids))
+
+
+def chunk_for_model(data: dict, max_tokens: int, overlap: int = 2,
+                    heading_re: "re.Pattern[str]" = HEADING_STYLE_RE, encoding: str = "json") -> list[dict]:
+    """把 to_model_prompt 的内容切成若干块，每块估算不超过 max_tokens，供并发调用模型。
+
+    - 切分单位是段落（正文、页眉页脚等部件）和整张表格，顺序为 正文 → 部件 → 表格；
+      id 保持全局编号，各块的 decisions 直接拼接即可注入
+    - 需要切时，优先切在块内靠后的标题段落（样式名匹配 heading_re）或正文 / 部件的边界之前，
+      前提是切点之前已用掉至少一半预算；否则就地切
+    - overlap > 0 时，每块带上同一正文 / 部件里紧挨块首的前 overlap 段，放在 context 里，
+      只供理解上下文，不在这一块里审阅（部件段落带 part 字段）；context 计入预算
+    - 单个条目超出预算时独占一块（不拆段落，id 才能保持不变），可配合 max_paragraph_chars
+    - 预算按 encoding 编码后的大小估算（各块再用 encode_for_model 以同一 encoding 输出）
+    """
+    if max_tokens <= 0:
+        raise ValueError(f"max_tokens must be positive, got {max_tokens}")
+    if encoding not in MODEL_ENCODINGS:
+        raise ValueError(f"unknown encoding {encoding!r}, expected one of {MODEL_ENCODINGS}")
+    # (stream, 条目)：stream 为 None 表示正文，部件名表示该部件，"tables" 表示表格
+    items: list[tuple[str | None, dict]] = [(None, p) for p in _slim_paragraphs(data)]
+    for part in data.get("parts") or []:
+        items += [(part["part"], p) for p in part["paragraphs"]]
+    items += [("tables", t) for t in _slim_tables(data)]
+    if encoding == "compact":
+        style_ids = _style_ids(data["paragraphs"])
+        costs = [_compact_item_tokens(stream, item, style_ids) for stream, item in items]
+        overhead = _CHUNK_OVERHEAD + estimate_tokens(COMPACT_FORMAT)
+    else:
+        costs = [_item_tokens(item, _ITEM_DEPTH if stream in (None, "tables") else _PART_ITEM_DEPTH)
+                 for stream, item in items]
+        overhead = _CHUNK_OVERHEAD
+
+    def head(name: str) -> int:
+        """块里每个部件的外壳（json 的 {"part": ..., "paragraphs": [...]}，compact 的 #part 行）。"""
+        if encoding == "compact":
+            return estimate_tokens(f"#part {name}") + 1
+        shell = {"part": name, "paragraphs": []}
+        return _item_tokens(shell, _ITEM_DEPTH)
+
+    heads = {stream: head(stream) for stream, _ in items if stream not in (None, "tables")}
+
+    def cost(i: int, start: int) -> int:
+        stream = items[i][0]
+        if stream in heads and (i == start or items[i - 1][0] != stream):
+            return costs[i] + heads[stream]
+        return costs[i]
+
+    def is_break(i: int) -> bool:
+        stream, item = items[i]
+        return stream != items[i - 1][0] or (stream is None and bool(heading_re.search(item["style"] or "")))
+
+    def context(start: int) -> list[int]:
+        stream = items[start][0]
+        if stream == "tables":
+            return []
+        first = start
+        while first > 0 and start - first < overlap and items[first - 1][0] == stream:
+            first -= 1
+        return list(range(first, start))
+
+    bounds: list[tuple[int, int]] = []
+    start = 0
+    while start < len(items):
+        used = overhead + sum(costs[j] for j in context(start))
+        end = start
+        last_break = None  # 最后一个可切点，及切在那里时已用的预算
+        while end < len(items):
+            if end > start and is_break(end):
+                last_break = (end, used)
+            if end > start and used + cost(end, start) > max_tokens:
+                break
+            used += cost(end, start)
+            end += 1
+        if end < len(items) and not (end > start and is_break(end)) and last_break \
+                and last_break[1] * 2 >= max_tokens:
+            end = last_break[0]
+        bounds.append((start, end))
+        start = end
+
+    chunks = []
+    for index, (start, end) in enumerate(bounds):
+        chunk: dict = {
+            "chunk": {"index": index, "count": len(bounds)},
+            "context": [items[j][1] if items[j][0] is None else {"part": items[j][0], **items[j][1]}
+                        for j in context(start)],
+            "paragraphs": [item for stream, item in items[start:end] if stream is None],
+            "tables": [item for stream, item in items[start:end] if stream == "tables"],
+        }
+        parts: dict[str, list[dict]] = {}
+        for stream, item in items[start:end]:
+            if stream not in (None, "tables"):
+                parts.setdefault(stream, []).append(item)
+        if parts:
+            chunk["parts"] = [{"part": name, "paragraphs": paras} for name, paras in parts.items()]
+        chunk["stats"] = data["stats"]
+        chunk["chunk"]["tokens"] = overhead + sum(costs[j] for j in context(start)) \
+            + sum(cost(i, start) for i in range(start, end))
+        chunks.append(chunk)
+    return chunks
+
+
+def write_ndjson(records: Iterable[dict], out, for_model: bool = False) -> None:
+    """iter_docx() 的记录逐行写成紧凑 JSON。for_model 时去掉空段落和 full_text（同 to_model_prompt）。"""
+    for record in records:
+        if for_model and record["type"] == "paragraph":
+            if not record["text"].strip():
+                continue
+            record.pop("full_text", None)
+        out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def _encoding_report(data: dict, chunk_tokens: int = 0, overlap: int = 2) -> str:
+    """各编码下 --for-model 输出的字符数和估算 token 数（分块时为各块合计），相对 json 的增减。"""
+    lines = [f"{'encoding':<10} {'chars':>10} {'~tokens':>10} {'vs json':>8}" + (f" {'chunks':>7}" if chunk_tokens else "")]
+    base = None
+    for encoding in MODEL_ENCODINGS:
+        if chunk_tokens:
+            chunks = chunk_for_model(data, chunk_tokens, overlap=overlap, encoding=encoding)
+            payloads = [encode_for_model(chunk, encoding) for chunk in chunks]
+        else:
+            payloads = [to_model_prompt(data, encoding=encoding)]
+        chars = sum(len(text) for text in payloads)
+        tokens = sum(estimate_tokens(text) for text in payloads)
+        base = base or tokens
+        delta = f"{(tokens - base) / base:+.1%}" if base and encoding != "json" else "-"
+        lines.append(f"{encoding:<10} {chars:>10} {tokens:>10} {delta:>8}"
+                     + (f" {len(payloads):>7}" if chunk_tokens else ""))
+    return "\n".join(lines)
+
+
+def _save_index(index: ParagraphIndex, docx_path: str) -> None:
+    path = index_path(docx_path)
+    index.save(path)
+    print(f"Wrote index: {path} ({len(index.paths)} paragraphs)", file=sys.stderr)
 
 
 def main() -> int:
@@ -99,16 +797,128 @@ def main() -> int:
                         help="Truncate paragraphs longer than this (0 = no truncation)")
     parser.add_argument("--for-model", action="store_true",
                         help="Output slim JSON for model prompt (no full_text field)")
+    parser.add_argument("--engine", choices=ENGINES, default="lxml",
+                        help="Extraction engine (default: lxml streaming; python-docx for comparison)")
+    parser.add_argument("--chunk-tokens", type=int, default=0, metavar="N",
+                        help="With --for-model: split into chunks of at most ~N tokens "
+                             "(one file per chunk with --output, else a JSON array)")
+    parser.add_argument("--overlap", type=int, default=2,
+                        help="Context paragraphs repeated before each chunk (default: 2)")
+    parser.add_argument("--previous", metavar="FILE",
+                        help="Previous version (.docx or its read_docx JSON): emit only added/changed paragraphs")
+    parser.add_argument("--id-map", metavar="FILE",
+                        help="With --previous: write the old -> new id mapping (the 'delta' section) to FILE")
+    parser.add_argument("--ndjson", action="store_true",
+                        help="Stream one compact JSON record per paragraph/table as extracted; stats last")
+    parser.add_argument("--index", action="store_true",
+                        help="Also write the paragraph index sidecar <input>.pidx that inject_comments.py picks up")
+    parser.add_argument("--encoding", choices=MODEL_ENCODINGS, default="json",
+                        help="With --for-model: payload encoding (default: json; compact = style dictionary "
+                             "+ id|style|text lines, same ids)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="With --for-model: print the estimated payload size per encoding instead of the payload")
     args = parser.parse_args()
+    if args.ndjson and (args.chunk_tokens or args.previous):
+        parser.error("--ndjson cannot be combined with --chunk-tokens or --previous")
+    if args.chunk_tokens and not args.for_model:
+        parser.error("--chunk-tokens requires --for-model")
+    if (args.encoding != "json" or args.estimate) and not args.for_model:
+        parser.error("--encoding / --estimate require --for-model")
+    if args.ndjson and args.estimate:
+        parser.error("--ndjson cannot be combined with --estimate")
+    if args.ndjson and args.encoding != "json":
+        parser.error("--ndjson streams JSON records; --encoding does not apply")
+    if args.id_map and not args.previous:
+        parser.error("--id-map requires --previous")
+
+    index = None
+    if args.index:
+        try:
+            index = ParagraphIndex(docx_digest(Path(args.input).read_bytes()))
+        except OSError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+
+    if args.ndjson:
+        records = iter_docx(args.input, max_paragraph_chars=args.max_paragraph_chars, engine=args.engine,
+                            index=index)
+        try:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    write_ndjson(records, f, for_model=args.for_model)
+                print(f"Wrote: {args.output}", file=sys.stderr)
+            else:
+                write_ndjson(records, sys.stdout, for_model=args.for_model)
+                sys.stdout.flush()
+        except BrokenPipeError:
+            # 下游提前关了管道（如 | head）：不报错；stdout 指向 devnull，免得退出时 flush 再抛一次。
+            # 记录没读完，段落索引不完整，不写 sidecar
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 141  # 128 + SIGPIPE，同 shell 里被管道关掉的命令
+        except Exception as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        if index is not None:
+            _save_index(index, args.input)
+        return 0
 
     try:
-        data = read_docx(args.input, max_paragraph_chars=args.max_paragraph_chars)
+        data = read_docx(args.input, max_paragraph_chars=args.max_paragraph_chars, engine=args.engine,
+                         index=index)
+        if args.previous:
+            if args.previous.lower().endswith(".docx"):
+                previous = read_docx(args.previous, max_paragraph_chars=args.max_paragraph_chars,
+                                     engine=args.engine)
+            else:
+                previous = json.loads(Path(args.previous).read_text(encoding="utf-8"))
+            data = diff_extraction(previous, data)
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
         return 1
 
+    if index is not None:
+        _save_index(index, args.input)
+
+    if args.previous:
+        body = data["delta"]["body"]
+        print(f"Delta vs {args.previous}: {body['unchanged']} unchanged, {len(body['moved'])} moved, "
+              f"{len(body['changed'])} changed, {len(body['added'])} added, {len(body['removed'])} removed "
+              f"(body); {len(data['tables'])} tables to re-send", file=sys.stderr)
+        if args.id_map:
+            Path(args.id_map).write_text(json.dumps(data["delta"], ensure_ascii=False, indent=2), encoding="utf-8")
+
+    if args.estimate:
+        try:
+            print(_encoding_report(data, args.chunk_tokens, args.overlap))
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.chunk_tokens:
+        try:
+            chunks = chunk_for_model(data, args.chunk_tokens, overlap=args.overlap, encoding=args.encoding)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        if not args.output:
+            if args.encoding == "json":
+                print(json.dumps(chunks, ensure_ascii=False, indent=2))
+            else:
+                print("\n".join(encode_for_model(chunk, args.encoding) for chunk in chunks), end="")
+            return 0
+        out_path = Path(args.output)
+        width = len(str(len(chunks)))
+        for chunk in chunks:
+            path = out_path.with_name(f"{out_path.stem}.{chunk['chunk']['index'] + 1:0{width}d}{out_path.suffix}")
+            path.write_text(encode_for_model(chunk, args.encoding), encoding="utf-8")
+        over = sum(1 for c in chunks if c["chunk"]["tokens"] > args.chunk_tokens)
+        print(f"Wrote {len(chunks)} chunks: {out_path.stem}.*{out_path.suffix}"
+              + (f" ({over} over budget: single paragraph too long)" if over else ""), file=sys.stderr)
+        return 0
+
     if args.for_model:
-        out = to_model_prompt(data)
+        out = to_model_prompt(data, encoding=args.encoding)
     else:
         out = json.dumps(data, ensure_ascii=False, indent=2)
 
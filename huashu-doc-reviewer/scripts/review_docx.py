@@ -5,36 +5,81 @@
     # 用预制 decisions JSON（不依赖模型）：
     python3 review_docx.py input.docx decisions.json --output reviewed.docx
 
+    # 多位审阅人（每个文件一组 --author/--initials），合并后一次注入：
+    python3 review_docx.py input.docx legal.json finance.json --output reviewed.docx \
+        --author 法务 --initials 法 --author 财务 --initials 财
+
+    # 注入后跑一遍完整性检查（不通过退出码为 1），适合 CI / 生产门禁：
+    python3 review_docx.py input.docx decisions.json --output reviewed.docx --check
+
     # 只读取生成给模型的精简 JSON（不做注入）：
     python3 review_docx.py input.docx --extract-only --output for_model.json
 
+    # 服务端库调用（bytes 进 bytes 出，不落盘）：
+    from review_docx import review_bytes
+    reviewed, result, errors = review_bytes(docx_bytes, raw_decisions)
+
 注意：本脚本**不直接调用 LLM**。模型调用由上层 agent 负责。
 本脚本的作用是：给定一个合法的 decisions.json，稳定、幂等地生成审阅 docx。
 """
 
 import argparse
 import json
+import os
 import sys
 from pathlib import Path
 
 # 保证同目录 import 可用
 sys.path.insert(0, str(Path(__file__).parent))
 
-from read_docx import read_docx, to_model_prompt  # noqa: E402
+from read_docx import MODEL_ENCODINGS, read_docx, to_model_prompt  # noqa: E402
 from validate_decisions import validate  # noqa: E402
-from inject_comments import inject  # noqa: E402
+from inject_comments import inject, inject_bytes, inject_many, reviewers_for  # noqa: E402
+from check_docx import check_docx  # noqa: E402
+
+
+def review_bytes(docx: bytes, raw_decisions, author: str = "Claude AI Reviewer",
+                 initials: str = "AI", locate: bool = False,
+                 incremental: bool = False) -> tuple[bytes, dict, list[str]]:
+    """校验 + 注入的纯内存版本：返回 (审阅后的 docx bytes, inject 摘要, 校验错误列表)。
+
+    raw_decisions 是模型输出解析后的 dict；不合法的条目按 validate() 的规则丢弃。
+    """
+    cleaned, errors = validate(raw_decisions, locate=locate)
+    reviewed, result = inject_bytes(docx, cleaned["decisions"], author=author, initials=initials,
+                                    locate=locate, incremental=incremental)
+    return reviewed, result, errors
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="End-to-end doc review pipeline")
     parser.add_argument("input", help="Input .docx file")
-    parser.add_argument("decisions", nargs="?",
-                        help="Input decisions.json (required unless --extract-only)")
+    parser.add_argument("decisions", nargs="*",
+                        help="Input decisions.json (required unless --extract-only); "
+                             "several files (one per reviewer) are merged and injected in one pass")
     parser.add_argument("--output", "-o", required=True, help="Output file")
     parser.add_argument("--extract-only", action="store_true",
                         help="Only extract paragraphs for model prompt; no injection")
-    parser.add_argument("--author", default="Claude AI Reviewer", help="Author name")
-    parser.add_argument("--initials", default="AI", help="Author initials")
+    parser.add_argument("--encoding", choices=MODEL_ENCODINGS, default="json",
+                        help="With --extract-only: model payload encoding (see read_docx.py --encoding)")
+    parser.add_argument("--author", action="append",
+                        help="Author name (default: Claude AI Reviewer); repeat once per decisions file")
+    parser.add_argument("--initials", action="append",
+                        help="Author initials (default: AI); repeat once per decisions file")
+    parser.add_argument("--locate", action="store_true",
+                        help="Resolve missing/wrong para_id by match_text (see inject_comments.py --locate)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-review an already reviewed docx (see inject_comments.py --incremental)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Byte-identical output for identical inputs (see inject_comments.py --deterministic)")
+    parser.add_argument("--cache-dir",
+                        help="On-disk result cache directory, requires --deterministic (see inject_comments.py --cache-dir)")
+    parser.add_argument("--coalesce-runs", action="store_true",
+                        help="Merge fragmented runs before injecting (see inject_comments.py --coalesce-runs)")
+    parser.add_argument("--parallel", type=int, nargs="?", const=os.cpu_count() or 1, default=0, metavar="N",
+                        help="Inject in N worker processes (see inject_comments.py --parallel)")
+    parser.add_argument("--check", action="store_true",
+                        help="Run the OOXML integrity check on the output; exit 1 if it fails (see check_docx.py)")
     args = parser.parse_args()
 
     if args.extract_only:
@@ -43,51 +88,69 @@ def main() -> int:
         except Exception as e:
             print(f"ERROR: {e}", file=sys.stderr)
             return 1
-        slim = to_model_prompt(data)
+        slim = to_model_prompt(data, encoding=args.encoding)
         Path(args.output).write_text(slim, encoding="utf-8")
-        print(f"Wrote slim JSON for model: {args.output}", file=sys.stderr)
+        print(f"Wrote slim {args.encoding} for model: {args.output}", file=sys.stderr)
         return 0
 
     if not args.decisions:
         parser.error("decisions argument required unless --extract-only")
-
-    # 校验 decisions
     try:
-        raw = json.loads(Path(args.decisions).read_text(encoding="utf-8"))
-    except Exception as e:
-        print(f"ERROR: cannot read {args.decisions}: {e}", file=sys.stderr)
-        return 1
+        reviewers = reviewers_for(len(args.decisions), args.author, args.initials)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.cache_dir and not args.deterministic:
+        parser.error("--cache-dir requires --deterministic (cached output keeps a fixed date)")
+
+    # 校验 decisions（每位审阅人的文件分别校验）
+    decision_sets = []
+    for path, (author, initials) in zip(args.decisions, reviewers):
+        try:
+            raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"ERROR: cannot read {path}: {e}", file=sys.stderr)
+            return 1
 
-    cleaned, errors = validate(raw)
-    if errors:
-        print(f"WARN: {len(errors)} validation errors (fallback: only valid decisions will be applied)",
-              file=sys.stderr)
-        for err in errors:
-            print(f"  - {err}", file=sys.stderr)
+        cleaned, errors = validate(raw, locate=args.locate)
+        if errors:
+            print(f"WARN: {path}: {len(errors)} validation errors "
+                  f"(fallback: only valid decisions will be applied)", file=sys.stderr)
+            for err in errors:
+                print(f"  - {err}", file=sys.stderr)
+        decision_sets.append((cleaned["decisions"], author, initials))
 
-    if not cleaned["decisions"]:
+    if not any(decisions for decisions, _, _ in decision_sets):
         print("ERROR: no valid decisions to apply", file=sys.stderr)
         return 1
 
-    # 写入临时清理后的 decisions，再传给 inject
-    import tempfile
-    tmp = tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False, encoding="utf-8")
-    json.dump(cleaned, tmp, ensure_ascii=False, indent=2)
-    tmp.close()
-
+    # 清理后的 decisions 直接在内存里交给 inject；多个文件合并后一次注入
+    options = dict(locate=args.locate, incremental=args.incremental, deterministic=args.deterministic,
+                   cache_dir=args.cache_dir, cache_max_bytes=512 << 20, coalesce=args.coalesce_runs,
+                   parallel=args.parallel)
     try:
-        result = inject(args.input, tmp.name, args.output,
-                       author=args.author, initials=args.initials)
+        if len(decision_sets) == 1:
+            decisions, author, initials = decision_sets[0]
+            result = inject(args.input, decisions, args.output,
+                            author=author, initials=initials, **options)
+        else:
+            result = inject_many(args.input, decision_sets, args.output, **options)
     except Exception as e:
         print(f"ERROR: inject failed: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc(file=sys.stderr)
         return 1
-    finally:
-        Path(tmp.name).unlink(missing_ok=True)
 
     print(json.dumps(result, ensure_ascii=False, indent=2))
     print(f"\nOutput: {result['output']}", file=sys.stderr)
+
+    if args.check:
+        stats, problems = check_docx(args.output)
+        if problems:
+            print(f"FAIL: integrity check found {len(problems)} problems:", file=sys.stderr)
+            for p in problems:
+                print(f"  - {p}", file=sys.stderr)
+            return 1
+        print(f"Integrity check OK ({stats['ms']} ms)", file=sys.stderr)
     return 0
 
 
@@ -5,9 +5,19 @@
 - clean_decisions: 所有通过校验的条目
 - errors: 每条失败的原因（用于提示模型重试）
 
+给了原文（--document，docx 或 read_docx 的 JSON）时再对照段落文本校验一遍：
+para_id 不存在、match_text 不在该段、同段修订区间重叠——这些 inject 时会被跳过的条目
+在这里一次查出；对找不到的 match_text 用 n-gram 倒排索引给出正确 para_id 的建议，
+连同错误一起进 build_retry_prompt()，模型一轮就能改对。
+
+--stream 边读边校验（stdin / 管道 / 文件）：decisions JSON、裸数组或 NDJSON 都行，
+每条 decision 一闭合就校验，通过的立即作为一行 NDJSON 写出，下游不必等模型生成完。
+
 用法：
     python3 validate_decisions.py decisions.json
     python3 validate_decisions.py decisions.json --output clean_decisions.json
+    python3 validate_decisions.py decisions.json --document input.docx --retry-prompt
+    model_cli ... | python3 validate_decisions.py - --stream | next_stage   # 边生成边校验，逐行输出
 
 退出码：
     0 = 全部通过
@@ -16,28 +26,50 @@
 """
 
 import argparse
+import codecs
+import difflib
 import json
+import re
 import sys
+import zipfile
+from collections import Counter
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Iterable, Iterator
+
+# 保证同目录 import 可用
+sys.path.insert(0, str(Path(__file__).parent))
 
 ALLOWED_MODES = {"contract", "report", "proposal", "resume", "general"}
 ALLOWED_ACTIONS = {"replace", "insert_after", "delete", "comment_only"}
 ALLOWED_SEVERITY = {"critical", "major", "minor", "info"}
+# 可选字段 part：decision 所在的 story 部件，缺省为正文
+ALLOWED_PART_RE = re.compile(r"word/(?:document|header\d+|footer\d+|footnotes|endnotes)\.xml")
+DOCUMENT_PART = "word/document.xml"
+
 
+def _validate_decision(d: Any, idx: int, locate: bool = False) -> tuple[bool, str]:
+    """校验单条 decision。返回 (is_valid, error_message)。
 
-def _validate_decision(d: Any, idx: int) -> tuple[bool, str]:
-    """校验单条 decision。返回 (is_valid, error_message)。"""
+    locate=True 时 para_id 可以缺失或为 null（由 inject 的 locate 模式按 match_text 定位）。
+    """
     if not isinstance(d, dict):
         return False, f"decisions[{idx}]: not a dict"
 
-    required = ["para_id", "match_text", "action", "comment", "severity"]
+    required = ["match_text", "action", "comment", "severity"]
+    if not locate:
+        required.insert(0, "para_id")
     for k in required:
         if k not in d:
             return False, f"decisions[{idx}]: missing field '{k}'"
 
-    if not isinstance(d["para_id"], int) or d["para_id"] < 0:
-        return False, f"decisions[{idx}]: 'para_id' must be non-negative int, got {d['para_id']!r}"
+    pid = d.get("para_id")
+    if not (locate and pid is None) and (not isinstance(pid, int) or pid < 0):
+        return False, f"decisions[{idx}]: 'para_id' must be non-negative int, got {pid!r}"
+
+    part = d.get("part")
+    if part is not None and (not isinstance(part, str) or not ALLOWED_PART_RE.fullmatch(part)):
+        return False, (f"decisions[{idx}]: 'part' must be word/document.xml, word/headerN.xml, "
+                       f"word/footerN.xml, word/footnotes.xml or word/endnotes.xml, got {part!r}")
 
     if not isinstance(d["match_text"], str) or not d["match_text"].strip():
         return False, f"decisions[{idx}]: 'match_text' must be non-empty string"
@@ -64,11 +96,210 @@ def _validate_decision(d: Any, idx: int) -> tuple[bool, str]:
     return True, ""
 
 
-def validate(raw: Any) -> tuple[dict, list[str]]:
+# --- 对照原文校验（--document） ---
+#
+# document 是 {部件名: {para_id: 段落文本}}，正文部件为 word/document.xml。
+# 从 docx 读时文本与 inject 的 RunIndex 逐字相同（段落直接子 run 的 w:t），校验结论与注入一致；
+# 从 read_docx 的 JSON 读时是模型看到的文本（超链接、制表符等与 inject 略有出入）。
+
+NGRAM = 3
+# 倒排索引候选：与 match_text 共有的 n-gram 占比至少这么多才给建议
+SUGGEST_MIN_SCORE = 0.5
+SUGGEST_LIMIT = 3
+
+
+def load_document(path: str | Path) -> dict[str, dict[int, str]]:
+    """读原文段落：.docx 按 inject 的编号和文本；否则当作 read_docx 的输出 JSON
+    （完整 / --for-model / --chunk-tokens 的数组或单块均可，分块时只含块内段落）。"""
+    path = Path(path)
+    if path.suffix.lower() == ".docx":
+        # 只有对照 docx 才需要 lxml / python-docx；纯 schema 校验保持零依赖
+        from lxml import etree
+        from inject_comments import STORY_PART_RE, RunIndex, qn
+
+        document: dict[str, dict[int, str]] = {}
+        with zipfile.ZipFile(path) as z:
+            for name in [DOCUMENT_PART] + sorted(n for n in z.namelist() if STORY_PART_RE.fullmatch(n)):
+                root = etree.fromstring(z.read(name))
+                document[name] = {pid: RunIndex(p).text for pid, p in enumerate(root.iter(qn("w:p")))}
+        return document
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    document = {}
+    for chunk in data if isinstance(data, list) else [data]:
+        body = document.setdefault(DOCUMENT_PART, {})
+        paragraphs = chunk.get("paragraphs", []) + [p for p in chunk.get("context", []) if "part" not in p]
+        paragraphs += [p for t in chunk.get("tables", []) for c in t.get("cells", []) for p in c["paragraphs"]]
+        for p in paragraphs:
+            body[p["id"]] = p.get("full_text", p["text"])
+        for part in chunk.get("parts", []):
+            document.setdefault(part["part"], {}).update((p["id"], p["text"]) for p in part["paragraphs"])
+        for p in chunk.get("context", []):
+            if "part" in p:
+                document.setdefault(p["part"], {})[p["id"]] = p["text"]
+    return document
+
+
+def _ngrams(text: str) -> set[str]:
+    if len(text) <= NGRAM:
+        return {text} if text else set()
+    return {text[k:k + NGRAM] for k in range(len(text) - NGRAM + 1)}
+
+
+def _excerpt(text: str, needle: str) -> str:
+    """text 里与 needle 对齐的一段：以最长公共子串为锚，向两侧扩到 needle 首尾的匹配块，
+    最长不超过 needle 的两倍。"""
+    blocks = [m for m in difflib.SequenceMatcher(None, text, needle, autojunk=False).get_matching_blocks()
+              if m.size]
+    if not blocks:
+        return text[:len(needle)]
+    anchor = max(blocks, key=lambda m: m.size)
+    start = max(0, blocks[0].a - blocks[0].b, anchor.a - len(needle))
+    end = min(len(text), blocks[-1].a + blocks[-1].size + len(needle) - blocks[-1].b - blocks[-1].size,
+              anchor.a + anchor.size + len(needle))
+    return text[start:end]
+
+
+class DocumentChecker:
+    """对照原文逐条校验已通过 schema 的 decision（同段修订区间要跨条目记账，所以有状态）。
+
+    与 inject 的判定一致：match_text 在目标段落里精确或归一化后出现即可；
+    同段带修订的条目区间重叠时，后出现的报错（区间用 inject 同一套 TextSpans 在原文上算）。
+    locate=True 时 para_id 只作参考，match_text 出现在同部件任一段落即可（inject 会改派过去）。
+    找不到的 match_text 先记下，errors() 时统一查建议：用一个 n-gram 倒排索引，
+    先收集所有漏网 match_text 的 n-gram，再把全文扫一遍，只登记这些 n-gram 的出现段落，按共有比例排序；
+    短于 NGRAM 的 match_text（如"甲方"）凑不出 n-gram，直接在各段归一化文本里找子串。
+    """
+
+    def __init__(self, document: dict[str, dict[int, str]], locate: bool = False):
+        from inject_comments import TextSpans, normalize_text
+
+        self.document = document
+        self.locate = locate
+        self.normalize = normalize_text
+        self.text_spans = TextSpans
+        self.failed: list[tuple[int, str]] = []
+        self.misses: list[tuple[int, str, int | None, str, str]] = []  # (下标, 部件, para_id, 错误前缀, 归一化 match)
+        self._revised: dict[tuple[str, int], list[tuple[int, int, int]]] = {}
+        self._norm: dict[tuple[str, int], str] = {}
+        self._spans: dict[tuple[str, int], Any] = {}  # TextSpans
+
+    def norm(self, part: str, pid: int) -> str:
+        key = (part, pid)
+        if key not in self._norm:
+            self._norm[key] = self.normalize(self.document[part][pid])
+        return self._norm[key]
+
+    def span(self, part: str, pid: int, match: str) -> tuple[int, int] | None:
+        """match_text 在段落原文里的区间，与 inject 的 _resolve_paragraph 相同；找不到为 None。"""
+        key = (part, pid)
+        if key not in self._spans:
+            self._spans[key] = self.text_spans(self.document[part][pid])
+        return self._spans[key].find(match)
+
+    def _contains(self, part: str, pid: int, match: str, needle: str) -> bool:
+        return match in self.document[part][pid] or bool(needle) and needle in self.norm(part, pid)
+
+    def check(self, i: int, d: dict) -> bool:
+        """校验 decisions[i]，通过返回 True；不通过时原因记入 failed / misses。"""
+        part, pid, match = d.get("part") or DOCUMENT_PART, d.get("para_id"), d["match_text"]
+        needle = self.normalize(match).strip()
+        texts = self.document.get(part)
+        if texts is None:
+            self.failed.append((i, f"decisions[{i}]: part {part!r} not in document"))
+            return False
+        if pid is not None and pid not in texts:
+            if not self.locate:
+                self.misses.append((i, part, pid, f"decisions[{i}]: para_id={pid} not in {part}", needle))
+                return False
+            pid = None
+        span = self.span(part, pid, match) if pid is not None else None
+        if span is None:
+            if self.locate and any(self._contains(part, k, match, needle) for k in texts):
+                return True
+            where = f"para_id={pid}" if pid is not None else part
+            self.misses.append((i, part, pid, f"decisions[{i}]: match_text {match!r} not found in {where}", needle))
+            return False
+        if d["action"] != "comment_only":
+            start, end = span
+            spans = self._revised.setdefault((part, pid), [])
+            clash = next((j for s, e, j in spans if s < end and start < e), None)
+            if clash is not None:
+                self.failed.append((i, f"decisions[{i}]: match_text {match!r} overlaps decisions[{clash}] "
+                                       f"in para_id={pid}"))
+                return False
+            spans.append((start, end, i))
+        return True
+
+    def errors(self) -> list[tuple[int, str]]:
+        """所有不通过的 [(下标, 错误)]，按下标排序；漏网的 match_text 附上建议的段落。"""
+        failed = list(self.failed)
+        if not self.misses:
+            return sorted(failed)
+
+        # 倒排索引：只为漏网 match_text 的 n-gram 建 posting；
+        # 比 NGRAM 短的 match_text 本身就不到一个 n-gram，进不了索引，后面直接找子串
+        norm = self.norm
+        wanted = {i: _ngrams(needle) for i, _, _, _, needle in self.misses if len(needle) >= NGRAM}
+        postings: dict[str, set[tuple[str, int]]] = {g: set() for grams in wanted.values() for g in grams}
+        for part, texts in self.document.items():
+            for pid in texts:
+                for g in _ngrams(norm(part, pid)) & postings.keys():
+                    postings[g].add((part, pid))
+
+        for i, part, pid, prefix, needle in self.misses:
+            if i in wanted:
+                grams = wanted[i]
+                scores = Counter(key for g in grams for key in postings[g])
+            else:
+                grams = {needle} if needle else set()
+                scores = Counter({(p, k): 1 for p, texts in self.document.items() for k in texts
+                                  if needle and needle in norm(p, k)})
+
+            def rank(key: tuple[str, int]) -> tuple:
+                exact = scores[key] == len(grams) and needle in norm(*key)
+                distance = abs(key[1] - pid) if key[0] == part and pid is not None else 1 << 30
+                return (not exact, -scores[key], key[0] != part, distance)
+
+            candidates = sorted((k for k, n in scores.items() if n >= SUGGEST_MIN_SCORE * len(grams)), key=rank)
+            hints = []
+            for key in candidates[:SUGGEST_LIMIT]:
+                target = f"para_id={key[1]}" + (f" in {key[0]}" if key[0] != part else "")
+                if scores[key] == len(grams) and needle in norm(*key):
+                    hints.append(f"found in {target}")
+                else:
+                    hints.append(f"closest {target} ({scores[key] / len(grams):.0%} {NGRAM}-grams): "
+                                 f"{_excerpt(self.document[key[0]][key[1]], needle)!r}")
+            failed.append((i, prefix + ("; " + "; ".join(hints) if hints else "; no similar paragraph")))
+        return sorted(failed)
+
+
+def check_against_document(items: list[tuple[int, dict]], document: dict[str, dict[int, str]],
+                           locate: bool = False) -> list[tuple[int, str]]:
+    """对照原文校验已通过 schema 的 [(decisions 下标, decision)]，返回 [(下标, 错误)]（见 DocumentChecker）。"""
+    checker = DocumentChecker(document, locate=locate)
+    for i, d in items:
+        checker.check(i, d)
+    return checker.errors()
+
+
+def _normalized(d: dict) -> dict:
+    """通过校验的条目：规范化 new_text 字段（delete / comment_only 一律为 null）。"""
+    nd = dict(d)
+    if nd["action"] in {"delete", "comment_only"}:
+        nd["new_text"] = None
+    return nd
+
+
+def validate(raw: Any, locate: bool = False, document: dict[str, dict[int, str]] | None = None
+             ) -> tuple[dict, list[str]]:
     """校验整个 decisions JSON。返回 (cleaned_dict, errors_list)。
 
     cleaned_dict 格式：{"mode": ..., "decisions": [...通过的条目...]}
     即使 errors 非空，cleaned 中的条目仍保证合法可用。
+    locate=True 时允许 para_id 缺失/为 null（配合 inject_comments.py --locate）。
+    document 为 load_document() 的结果时，通过 schema 的条目再对照原文校验（见 check_against_document），
+    对不上的也从 cleaned 中剔除。
     """
     errors: list[str] = []
 
@@ -86,19 +317,209 @@ def validate(raw: Any) -> tuple[dict, list[str]]:
     if not isinstance(decisions, list):
         return {"mode": mode, "decisions": []}, errors + ["'decisions' must be a list"]
 
-    clean: list[dict] = []
+    clean: list[tuple[int, dict]] = []
     for i, d in enumerate(decisions):
-        ok, err = _validate_decision(d, i)
+        ok, err = _validate_decision(d, i, locate=locate)
         if ok:
-            # 规范化 new_text 字段
-            nd = dict(d)
-            if nd["action"] in {"delete", "comment_only"}:
-                nd["new_text"] = None
-            clean.append(nd)
+            clean.append((i, _normalized(d)))
         else:
             errors.append(err)
 
-    return {"mode": mode, "decisions": clean}, errors
+    if document is not None:
+        failed = check_against_document(clean, document, locate=locate)
+        errors.extend(err for _, err in failed)
+        bad = {i for i, _ in failed}
+        clean = [(i, d) for i, d in clean if i not in bad]
+
+    return {"mode": mode, "decisions": [d for _, d in clean]}, errors
+
+
+# --- 流式校验（--stream）：模型边生成边校验 ---
+#
+# 输入可以是三种形状，混用也行：
+#   - 完整 decisions JSON {"mode": ..., "decisions": [...]}：decisions 数组里每个元素一闭合就产出
+#   - 裸数组 [{...}, {...}]
+#   - NDJSON：每行一条 decision；只有 mode 键的对象（{"mode": "contract"}）当作表头
+# 模型常包的 ```json 围栏行会被跳过。
+
+class DecisionStream:
+    """decisions 流的增量解析器：feed() 喂入任意切分的文本，返回这次新解析完的事件。
+
+    事件为 ("mode", 值)、("decision", 对象) 或 ("error", 信息)。顶层对象按键逐个解析，遇到 "decisions": [ 就进入数组，
+    数组元素用 json 的 raw_decode 整个解析——元素没收全（raw_decode 失败、或数字恰好停在缓冲区末尾）
+    就等下一块。格式错误要到 close() 时才能与"还没收全"区分开，在那里抛 ValueError。
+    "decisions" 的值不是数组（null、对象等）时报一条 error（同 validate()），该对象当外层包装丢弃。
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "top"       # top | object | array
+        self._in_object = False   # array 结束后回到顶层对象还是顶层
+        self._obj: dict = {}
+        self._has_decisions = False
+        self._closed = False
+
+    def _skip(self, chars: str) -> bool:
+        """跳过 chars 里的字符；缓冲区用完返回 False。"""
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return pos < len(buf)
+
+    def _decode(self) -> tuple[bool, Any]:
+        """在当前位置解析一个完整的 JSON 值。没收全返回 (False, None)。"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise ValueError(f"invalid JSON in decisions stream near {self._buf[self._pos:self._pos + 40]!r}")
+            return False, None
+        # 数字 / true 等没有结束符，停在缓冲区末尾时后面可能还有字符
+        if end == len(self._buf) and not self._closed and not isinstance(value, (dict, list, str)):
+            return False, None
+        self._pos = end
+        return True, value
+
+    def feed(self, text: str) -> list[tuple[str, Any]]:
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        events: list[tuple[str, Any]] = []
+        while True:
+            if self._state == "top":
+                if not self._skip(" \t\r\n,"):
+                    break
+                if "```".startswith(self._buf[self._pos:]) and not self._closed:
+                    break  # 可能是被切开的围栏
+                if self._buf.startswith("```", self._pos):
+                    eol = self._buf.find("\n", self._pos)
+                    if eol < 0 and not self._closed:
+                        break
+                    self._pos = len(self._buf) if eol < 0 else eol + 1
+                    continue
+                c = self._buf[self._pos]
+                if c not in "[{":
+                    raise ValueError(f"unexpected {c!r} in decisions stream, expected '{{' or '['")
+                self._pos += 1
+                if c == "[":
+                    self._state, self._in_object = "array", False
+                else:
+                    self._state, self._obj, self._has_decisions = "object", {}, False
+            elif self._state == "object":
+                if not self._skip(" \t\r\n,"):
+                    break
+                if self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "top"
+                    if self._has_decisions or set(self._obj) == {"mode"}:
+                        continue  # 完整 decisions JSON 的结尾，或 NDJSON 表头（mode 已经报过）
+                    events.append(("decision", self._obj))
+                    continue
+                mark = self._pos
+                ok, key = self._decode()
+                if ok and not isinstance(key, str):
+                    raise ValueError(f"invalid object key {key!r} in decisions stream")
+                if not ok or not self._skip(" \t\r\n"):
+                    self._pos = mark
+                    break
+                if self._buf[self._pos] != ":":
+                    raise ValueError(f"expected ':' after {key!r} in decisions stream")
+                self._pos += 1
+                if not self._skip(" \t\r\n"):
+                    self._pos = mark
+                    break
+                if key == "decisions" and self._buf[self._pos] == "[":
+                    self._pos += 1
+                    self._state, self._in_object, self._has_decisions = "array", True, True
+                    continue
+                ok, value = self._decode()
+                if not ok:
+                    self._pos = mark
+                    break
+                self._obj[key] = value
+                if key == "mode":
+                    events.append(("mode", value))
+                elif key == "decisions":
+                    self._has_decisions = True  # 外层包装，不是 decision
+                    events.append(("error", "'decisions' must be a list"))
+            else:  # array
+                if not self._skip(" \t\r\n,"):
+                    break
+                if self._buf[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "object" if self._in_object else "top"
+                    continue
+                ok, value = self._decode()
+                if not ok:
+                    break
+                events.append(("decision", value))
+        return events
+
+    def close(self) -> list[tuple[str, Any]]:
+        """输入结束：解析缓冲区里剩下的内容；结构没闭合或格式错误时抛 ValueError。"""
+        self._closed = True
+        events = self.feed("")
+        if self._state != "top":
+            raise ValueError("decisions stream ended inside an unterminated "
+                             + ("array" if self._state == "array" else "object"))
+        return events
+
+
+def validate_stream(chunks: Iterable[str], locate: bool = False,
+                    document: dict[str, dict[int, str]] | None = None,
+                    errors: list[str] | None = None) -> Iterator[dict]:
+    """边读边校验 decisions 流（形状见 DecisionStream），每条 decision 一闭合就校验，
+    通过的立即产出，下游（定位、预切分）不必等模型生成完。
+
+    第一条产出是表头 {"mode": ...}：取第一条 decision 到达前见到的 mode，没见到为 general。
+    其后是清理过的 decision，判定与 validate() 相同；错误按发生顺序追加到 errors。
+    document 不为 None 时同时对照原文校验（DocumentChecker）：对不上的条目不产出，
+    它们的建议要全文扫一遍，流结束后才一并追加到 errors。
+    结构错误（JSON 不合法、没闭合）抛 ValueError，此前产出的条目仍然有效。
+    """
+    if errors is None:
+        errors = []
+    checker = DocumentChecker(document, locate=locate) if document is not None else None
+    parser = DecisionStream()
+    mode = None
+    count = 0
+
+    def handle(events: list[tuple[str, Any]]) -> Iterator[dict]:
+        nonlocal mode, count
+        for kind, value in events:
+            if kind == "error":
+                errors.append(value)
+                continue
+            if kind == "mode":
+                if mode is None:
+                    mode = value
+                    if value not in ALLOWED_MODES:
+                        errors.append(f"mode={value!r} not in {ALLOWED_MODES}; coerced to 'general'")
+                        mode = "general"
+                    yield {"mode": mode}
+                continue
+            if mode is None:
+                mode = "general"
+                yield {"mode": mode}
+            i = count
+            count += 1
+            ok, err = _validate_decision(value, i, locate=locate)
+            if not ok:
+                errors.append(err)
+            elif checker is None or checker.check(i, value):
+                yield _normalized(value)
+
+    for chunk in chunks:
+        yield from handle(parser.feed(chunk))
+    try:
+        yield from handle(parser.close())
+    finally:
+        if checker is not None:
+            errors.extend(err for _, err in checker.errors())
+    if mode is None:
+        yield {"mode": "general"}
 
 
 def build_retry_prompt(errors: list[str]) -> str:
@@ -106,23 +527,108 @@ def build_retry_prompt(errors: list[str]) -> str:
     if not errors:
         return "No errors. JSON is valid."
     lines = [
-        "你上次输出的 decisions JSON 中以下条目不符合 schema：",
+        "你上次输出的 decisions JSON 中以下条目不符合 schema 或与原文对不上：",
     ]
     lines.extend(f"  - {e}" for e in errors)
     lines.append("")
     lines.append("请重新输出完整的 JSON，修正以上问题。只输出 JSON，不加任何解释文字。")
     lines.append("必须字段：para_id(int), match_text(str), action(replace|insert_after|delete|comment_only), "
-                 "new_text(str|null), comment(str), severity(critical|major|minor|info)")
+                 "new_text(str|null), comment(str), severity(critical|major|minor|info)；"
+                 "页眉/页脚/脚注/尾注里的段落另加 part(str)")
+    if any("para_id=" in e and ("found in" in e or "closest" in e) for e in errors):
+        lines.append("match_text 必须逐字出现在 para_id 指向的段落里；错误后面给出了实际包含（或最接近）"
+                     "该文字的段落，按它改 para_id / part，或照抄其中的原文改 match_text。")
     return "\n".join(lines)
 
 
+def _read_chunks(f: BinaryIO, size: int = 1 << 16) -> Iterator[str]:
+    """从管道 / 文件读取当前已有的字节（read1 不等凑满 size），增量解码为 UTF-8 文本。"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    read = getattr(f, "read1", f.read)
+    while True:
+        data = read(size)
+        if not data:
+            break
+        yield decoder.decode(data)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def _report(errors: list[str], retry_prompt: bool) -> None:
+    print(f"\n{len(errors)} validation errors:", file=sys.stderr)
+    for e in errors:
+        print(f"  - {e}", file=sys.stderr)
+    if retry_prompt:
+        print("\n---Retry prompt---", file=sys.stderr)
+        print(build_retry_prompt(errors), file=sys.stderr)
+
+
+def _main_stream(args: argparse.Namespace, document: dict[str, dict[int, str]] | None) -> int:
+    """--stream：清理过的 decision 逐行写出（NDJSON，首行是 mode 表头），错误随到随报。"""
+    errors: list[str] = []
+    reported = 0
+    count = -1  # 表头不计
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for record in validate_stream(_read_chunks(src), locate=args.locate, document=document, errors=errors):
+            out.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            out.flush()
+            count += 1
+            for err in errors[reported:]:
+                print(f"WARN: {err}", file=sys.stderr)
+            reported = len(errors)
+    except ValueError as e:
+        print(f"ERROR: {e} ({count} decisions already emitted)", file=sys.stderr)
+        return 2
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+
+    if args.output:
+        print(f"Wrote: {args.output}", file=sys.stderr)
+    if errors:
+        _report(errors, args.retry_prompt)
+        return 1
+    print(f"OK: {count} decisions, all valid", file=sys.stderr)
+    return 0
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Validate decisions JSON")
-    parser.add_argument("input", help="Input decisions.json")
+    parser.add_argument("input", help="Input decisions.json ('-' = stdin with --stream)")
     parser.add_argument("--output", "-o", help="Output cleaned JSON (default: stdout)")
     parser.add_argument("--retry-prompt", action="store_true",
                         help="Print a retry prompt for the model on stderr")
+    parser.add_argument("--locate", action="store_true",
+                        help="Allow missing/null para_id (for inject_comments.py --locate)")
+    parser.add_argument("--document", metavar="FILE",
+                        help="Also check para_id / match_text against the source (.docx, or read_docx JSON); "
+                             "misses get para_id suggestions")
+    parser.add_argument("--stream", action="store_true",
+                        help="Validate while reading (decisions JSON, bare array or NDJSON, e.g. piped from the "
+                             "model); write each cleaned decision as an NDJSON line as soon as it completes")
     args = parser.parse_args()
+    if args.input == "-" and not args.stream:
+        parser.error("reading from stdin ('-') requires --stream")
+
+    document = None
+    if args.document:
+        try:
+            document = load_document(args.document)
+        except Exception as e:
+            print(f"ERROR: Cannot read {args.document}: {e}", file=sys.stderr)
+            return 2
+
+    if args.stream:
+        try:
+            return _main_stream(args, document)
+        except OSError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 2
 
     try:
         raw = json.loads(Path(args.input).read_text(encoding="utf-8"))
@@ -130,7 +636,7 @@ def main() -> int:
         print(f"ERROR: Cannot parse {args.input}: {e}", file=sys.stderr)
         return 2
 
-    cleaned, errors = validate(raw)
+    cleaned, errors = validate(raw, locate=args.locate, document=document)
 
     out = json.dumps(cleaned, ensure_ascii=False, indent=2)
     if args.output:
@@ -140,12 +646,7 @@ def main() -> int:
         print(out)
 
     if errors:
-        print(f"\n{len(errors)} validation errors:", file=sys.stderr)
-        for e in errors:
-            print(f"  - {e}", file=sys.stderr)
-        if args.retry_prompt:
-            print("\n---Retry prompt---", file=sys.stderr)
-            print(build_retry_prompt(errors), file=sys.stderr)
+        _report(errors, args.retry_prompt)
         return 1
 
     print(f"OK: {len(cleaned['decisions'])} decisions, all valid", file=sys.stderr)